@@ -1,19 +1,408 @@
 
 import os
 import json
-from flask import Flask, render_template, jsonify, request, session
+from flask import Flask, render_template, jsonify, request, session, stream_with_context, g
 import logging
-from datetime import datetime
-import uuid
+import logging.handlers
+import queue
+from datetime import datetime, timedelta
+import gzip
+import hashlib
+import secrets
+import csv
+from collections import namedtuple
+from types import MappingProxyType
+import base64
+import random
+from bisect import bisect_left, bisect_right
+import heapq
+from array import array
+from collections import OrderedDict, deque
+import itertools
+import sys
+import re
+import time
+import threading
+import atexit
+import contextlib
+import gc
+import sqlite3
+from werkzeug.exceptions import HTTPException
+from jinja2 import DictLoader, Environment, FileSystemBytecodeCache
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Configure logging. Records are handed to a queue on the request thread and
+# formatted and written in batches by a background thread, so log I/O stays
+# off the request path. Level and format default per APP_ENV.
+APP_ENV = os.environ.get("APP_ENV", "development")
+LOG_DEFAULTS = {
+    'development': {'level': 'DEBUG', 'format': 'text'},
+    'production': {'level': 'INFO', 'format': 'json'},
+}
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+class AsyncLogHandler(logging.handlers.QueueHandler):
+    # Unlike QueueHandler, leave the record unformatted: message formatting
+    # happens on the writer thread. A full queue drops the record rather than
+    # stalling the request.
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class BatchingLogWriter:
+    # Wakes at most every flush_interval seconds, then drains up to batch_size
+    # queued records and writes them with one call
+    def __init__(self, log_queue, stream, formatter, batch_size=1024, flush_interval=0.05):
+        self.queue = log_queue
+        self.stream = stream
+        self.formatter = formatter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            if batch[0] is not None:
+                time.sleep(self.flush_interval)
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            lines = []
+            for record in batch:
+                if record is None:
+                    continue
+                try:
+                    lines.append(self.formatter.format(record))
+                except Exception:
+                    lines.append(f"Unformattable log record from {record.name}: {record.msg!r}")
+            if lines:
+                self.stream.write('\n'.join(lines) + '\n')
+                self.stream.flush()
+            if stop:
+                return
+
+    def stop(self):
+        self.queue.put(None)
+        self._thread.join()
+
+_log_writer = None
+
+def configure_logging(level=None, fmt=None, use_queue=None, stream=None):
+    global _log_writer
+    defaults = LOG_DEFAULTS.get(APP_ENV, LOG_DEFAULTS['production'])
+    level = level or os.environ.get("LOG_LEVEL", defaults['level'])
+    fmt = fmt or os.environ.get("LOG_FORMAT", defaults['format'])
+    if use_queue is None:
+        use_queue = os.environ.get("LOG_ASYNC", "1") != "0"
+    stream = stream or sys.stderr
+
+    if fmt == 'json':
+        formatter = JsonLogFormatter()
+    else:
+        formatter = logging.Formatter(logging.BASIC_FORMAT)
+
+    root = logging.getLogger()
+    if _log_writer is not None:
+        _log_writer.stop()
+        _log_writer = None
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    if use_queue:
+        log_queue = queue.Queue(int(os.environ.get("LOG_QUEUE_SIZE", 10000)))
+        _log_writer = BatchingLogWriter(log_queue, stream, formatter)
+        _log_writer.start()
+        root.addHandler(AsyncLogHandler(log_queue))
+    else:
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+    root.setLevel(level)
+
+def shutdown_logging():
+    global _log_writer
+    if _log_writer is not None:
+        _log_writer.stop()
+        _log_writer = None
+
+configure_logging()
+atexit.register(shutdown_logging)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 # Set a default session secret for development
 app.secret_key = os.environ.get("SESSION_SECRET", "dev_secret_key")
 
+# Request instrumentation. Before/after request hooks time every request into
+# a histogram per route and method, and phase() times the steps inside a
+# request (template loading and rendering, JSON parsing, validation,
+# persistence, order scans) into a histogram per phase. Both are served in
+# Prometheus text format on /metrics. Metrics are per process.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+METRIC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    __slots__ = ('counts', 'sum', '_lock')
+
+    def __init__(self):
+        # One count per bucket plus +Inf; cumulated only when rendered
+        self.counts = [0] * (len(METRIC_BUCKETS) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect_left(METRIC_BUCKETS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (name, labels) -> Histogram, where labels is a tuple of pairs
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def observe(self, name, labels, seconds):
+        histogram = self._histograms.get((name, labels))
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault((name, labels), Histogram())
+        histogram.observe(seconds)
+
+    def increment(self, name, labels):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + 1
+
+    def render(self, gauges=()):
+        # gauges: (name, help, value) computed by the caller at scrape time
+        def label_text(labels):
+            return ','.join(f'{key}="{value}"' for key, value in labels)
+
+        lines = []
+        described = set()
+        def header(name):
+            if name not in described and name in self._help:
+                kind, text = self._help[name]
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+            described.add(name)
+
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        for (name, labels), histogram in histograms:
+            header(name)
+            with histogram._lock:
+                counts, total = list(histogram.counts), histogram.sum
+            prefix = label_text(labels) + ',' if labels else ''
+            cumulative = 0
+            for bound, count in zip(METRIC_BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{label_text(labels)}}} {total}")
+            lines.append(f"{name}_count{{{label_text(labels)}}} {cumulative}")
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f"{name}{{{label_text(labels)}}} {value}")
+        for name, text, value in gauges:
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+metrics.describe('http_request_duration_seconds', 'histogram', "Time spent handling requests")
+metrics.describe('http_requests_total', 'counter', "Requests handled, by status")
+metrics.describe('app_phase_duration_seconds', 'histogram', "Time spent in each request phase")
+
+class _PhaseTimer:
+    __slots__ = ('labels', 'start')
+
+    def __init__(self, labels):
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        metrics.observe('app_phase_duration_seconds', self.labels, time.perf_counter() - self.start)
+
+_phase_labels = {}
+_no_phase = contextlib.nullcontext()
+
+def phase(name):
+    if not METRICS_ENABLED:
+        return _no_phase
+    labels = _phase_labels.get(name)
+    if labels is None:
+        labels = _phase_labels[name] = (('phase', name),)
+    return _PhaseTimer(labels)
+
+# Opt-in sampling profiler for slow requests. With PROFILE_SLOW_MS set, a
+# background thread samples the stacks of threads that are handling a request
+# every PROFILE_INTERVAL_MS, and requests slower than the threshold have their
+# samples appended to PROFILE_OUTPUT in collapsed-stack format (one
+# "frame;frame;frame count" line per stack), ready for flamegraph.pl or
+# speedscope. The sampler needs the GIL to run, so a busy request is sampled
+# at most once per sys.getswitchinterval() (5 ms by default). Unset, the hooks
+# skip it entirely.
+PROFILE_SLOW_MS = os.environ.get("PROFILE_SLOW_MS")
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+PROFILE_OUTPUT = os.environ.get("PROFILE_OUTPUT", "slow-requests.folded")
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_seconds, interval_seconds, output_path):
+        self.threshold = threshold_seconds
+        self.interval = interval_seconds
+        self.output_path = output_path
+        self._lock = threading.Lock()
+        # thread id -> collapsed stacks sampled during its current request
+        self._active = {}
+        self._pid = None
+
+    def _ensure_sampler(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._run, name='request-profiler', daemon=True).start()
+            self._pid = os.getpid()
+
+    def begin(self):
+        self._ensure_sampler()
+        self._active[threading.get_ident()] = []
+
+    def end(self, label, duration):
+        samples = self._active.pop(threading.get_ident(), None)
+        if not samples or duration < self.threshold:
+            return
+        stacks = {}
+        for stack in samples:
+            stacks[stack] = stacks.get(stack, 0) + 1
+        lines = ''.join(f"{label};{stack} {count}\n" for stack, count in stacks.items())
+        with self._lock:
+            with open(self.output_path, 'a') as f:
+                f.write(lines)
+        logger.warning("Slow request %s took %.1f ms, %s samples written to %s",
+                       label, duration * 1e3, len(samples), self.output_path)
+
+    def discard(self):
+        self._active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            for ident, samples in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    samples.append(_collapse_stack(frame))
+
+def _collapse_stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+profiler = None
+if PROFILE_SLOW_MS:
+    profiler = SlowRequestProfiler(float(PROFILE_SLOW_MS) / 1e3, PROFILE_INTERVAL_MS / 1e3, PROFILE_OUTPUT)
+
+@app.before_request
+def start_request_timer():
+    if METRICS_ENABLED or profiler is not None:
+        g.request_start = time.perf_counter()
+        if profiler is not None:
+            profiler.begin()
+
+@app.after_request
+def record_request_metrics(response):
+    # Registered before every other after_request hook, so it runs last and
+    # the timing includes them
+    start = g.get('request_start')
+    if start is None:
+        return response
+    duration = time.perf_counter() - start
+    # Unmatched URLs share one label so probes can't grow the label set
+    route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+    if METRICS_ENABLED:
+        metrics.observe('http_request_duration_seconds', (('route', route), ('method', request.method)),
+                        duration)
+        metrics.increment('http_requests_total',
+                          (('route', route), ('method', request.method), ('status', str(response.status_code))))
+    if profiler is not None:
+        profiler.end(f"{request.method} {route}", duration)
+    return response
+
+@app.teardown_request
+def discard_request_samples(exc):
+    if profiler is not None:
+        profiler.discard()
+
+@app.route('/metrics')
+def metrics_endpoint():
+    gauges = [
+        ('app_orders', "Orders in the order store", len(orders)),
+        ('app_order_intake_queue', "Orders waiting for asynchronous persistence",
+         order_intake.queue.qsize()),
+        ('app_order_event_subscribers', "Open order status streams", len(order_events)),
+        ('app_carts', "Server-side carts", len(cart_store)),
+    ]
+    return app.response_class(metrics.render(gauges), content_type='text/plain; version=0.0.4; charset=utf-8',
+                              headers={'Cache-Control': 'no-cache'})
+
 # Mock menu data directly in the file to avoid file dependency
 MENU_DATA = {
     "categories": [
@@ -63,22 +452,1731 @@ MENU_DATA = {
 def load_menu_data():
     return MENU_DATA
 
-def generate_order_id():
-    # Generate a unique order ID using timestamp and uuid
-    timestamp = datetime.now().strftime("%Y%m%d%H%M")
-    unique_id = str(uuid.uuid4())[:8]
-    return f"ORD-{timestamp}-{unique_id}"
+# Item ID -> menu item (tagged with its category) and item ID -> unit price,
+# built once so order lines are validated and priced without scanning the menu
+MENU_INDEX = {}
+MENU_PRICES = {}
+
+def build_menu_index(menu_data=None):
+    menu_data = menu_data or load_menu_data()
+    index = {}
+    for category in menu_data['categories']:
+        for item in category['items']:
+            index[item['id']] = dict(item, category=category['id'])
+    MENU_INDEX.clear()
+    MENU_INDEX.update(index)
+    MENU_PRICES.clear()
+    MENU_PRICES.update((item_id, item['price']) for item_id, item in index.items())
+
+def price_order_items(items):
+    # Rebuild each order line from the menu index and total it with server
+    # prices; client-supplied names and prices are ignored. Raises ValueError
+    # for unknown items or bad quantities.
+    lines = []
+    total = 0
+    for item in items:
+        item_id = item.get('id')
+        price = MENU_PRICES.get(item_id)
+        if price is None:
+            raise ValueError(f"Unknown menu item: {item_id}")
+        quantity = item.get('quantity')
+        if type(quantity) is not int or quantity < 1:
+            raise ValueError(f"Invalid quantity for item {item_id}")
+        lines.append({'id': item_id, 'name': MENU_INDEX[item_id]['name'], 'price': price, 'quantity': quantity})
+        total += price * quantity
+    return lines, total
+
+# Precompressed copies of a body, one per supported Content-Encoding, each
+# with its own ETag; see _serve_variants
+def compress_variants(body, digest):
+    variants = {'identity': (body, digest)}
+    variants['gzip'] = (gzip.compress(body, compresslevel=9, mtime=0), digest + '-gz')
+    if brotli is not None:
+        variants['br'] = (brotli.compress(body, quality=11), digest + '-br')
+    return variants
+
+# Versioned JSON view of the menu for /api/menu. The full body is serialized
+# and compressed once per version and carries a content-hash ETag. Each item
+# remembers the version it last changed in, so ?since=<version> can return
+# just the delta, which is compressed once and cached until the next version.
+MENU_HISTORY_LIMIT = 100
+
+class MenuCatalog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = 0
+        self.body = b''
+        self.etag = ''
+        self.variants = compress_variants(b'', '')
+        self._items = {}
+        self._item_hashes = {}
+        self._item_versions = {}
+        self._removed = {}
+        self._categories = []
+        self._deltas = {}
+
+    def publish(self, menu_data):
+        items = {}
+        categories = []
+        for category in menu_data['categories']:
+            categories.append({
+                'id': category['id'],
+                'name': category['name'],
+                'description': category['description'],
+                'items': [item['id'] for item in category['items']],
+            })
+            for item in category['items']:
+                items[item['id']] = dict(item, category=category['id'])
+        hashes = {item_id: json.dumps(item, sort_keys=True) for item_id, item in items.items()}
+
+        with self._lock:
+            changed = [item_id for item_id, h in hashes.items() if self._item_hashes.get(item_id) != h]
+            removed = [item_id for item_id in self._item_hashes if item_id not in hashes]
+            if self.version and not changed and not removed and categories == self._categories:
+                return self.version
+
+            version = self.version + 1
+            for item_id in changed:
+                self._item_versions[item_id] = version
+                self._removed.pop(item_id, None)
+            for item_id in removed:
+                del self._item_versions[item_id]
+                self._removed[item_id] = version
+            # Forget tombstones older than the retained history
+            oldest = version - MENU_HISTORY_LIMIT
+            self._removed = {item_id: v for item_id, v in self._removed.items() if v > oldest}
+
+            body = json.dumps({'version': version, 'categories': [
+                dict(category, items=[items[item_id] for item_id in category['items']])
+                for category in categories
+            ]}, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+            self._items = items
+            self._item_hashes = hashes
+            self._categories = categories
+            self._deltas = {}
+            self.body = body
+            self.etag = hashlib.sha256(body).hexdigest()[:32]
+            self.variants = compress_variants(body, self.etag)
+            self.version = version
+            return version
+
+    def delta(self, since):
+        # Returns compress_variants for the items changed after version
+        # since, or None when since predates the retained history
+        since = min(since, self.version)
+        if since < self.version - MENU_HISTORY_LIMIT:
+            return None
+        cached = self._deltas.get(since)
+        if cached is not None:
+            return cached
+        with self._lock:
+            body = json.dumps({
+                'version': self.version,
+                'since': since,
+                'categories': self._categories,
+                'items': [self._items[item_id] for item_id, v in self._item_versions.items() if v > since],
+                'removed': [item_id for item_id, v in self._removed.items() if v > since],
+            }, separators=(',', ':'), sort_keys=True).encode('utf-8')
+            cached = compress_variants(body, f"{self.etag}-{since}")
+            self._deltas[since] = cached
+        return cached
+
+menu_catalog = MenuCatalog()
+
+def publish_menu(menu_data=None):
+    menu_data = menu_data or load_menu_data()
+    build_menu_index(menu_data)
+    return menu_catalog.publish(menu_data)
+
+publish_menu()
+
+# Order IDs are "ORD-" plus 16 base32hex characters encoding an 80-bit value:
+# 48 bits of Unix milliseconds, a 17-bit worker ID and a 15-bit sequence.
+# base32hex keeps ASCII order equal to numeric order, so IDs sort by creation
+# time and time ranges map to ID ranges. The sequence fills exactly the last
+# three characters, so the 13-character prefix is encoded once per
+# millisecond. The worker ID comes from ORDER_ID_WORKER, is assigned per
+# worker by the production server, or is drawn at random per process.
+ORDER_ID_PREFIX = "ORD-"
+_ORDER_ID_WORKER_BITS = 17
+_ORDER_ID_SEQ_BITS = 15
+_B32HEX = "0123456789ABCDEFGHIJKLMNOPQRSTUV"
+_B32HEX_PAIRS = [a + b for a in _B32HEX for b in _B32HEX]
+
+def _encode_order_id_value(value):
+    return ORDER_ID_PREFIX + base64.b32hexencode(value.to_bytes(10, 'big')).decode('ascii')
+
+class OrderIdGenerator:
+    def __init__(self, worker_id=None):
+        self._fixed_worker_id = worker_id
+        self._lock = threading.Lock()
+        self._pid = None
+        self._last_ms = 0
+        self._seq = 0
+        self._prefix = None
+
+    def set_worker(self, worker_id):
+        with self._lock:
+            self._fixed_worker_id = worker_id
+            self._reset_worker()
+
+    def _reset_worker(self):
+        if self._fixed_worker_id is not None:
+            worker_id = self._fixed_worker_id
+        else:
+            worker_id = random.SystemRandom().getrandbits(_ORDER_ID_WORKER_BITS)
+        self._worker_bits = (worker_id & ((1 << _ORDER_ID_WORKER_BITS) - 1)) << _ORDER_ID_SEQ_BITS
+        self._pid = os.getpid()
+        self._prefix = None
+
+    def __call__(self):
+        with self._lock:
+            return self._next_locked()
+
+    def many(self, count):
+        # count IDs, in order, for one lock acquisition
+        with self._lock:
+            return [self._next_locked() for _ in range(count)]
+
+    def _next_locked(self):
+        if self._pid != os.getpid():
+            self._reset_worker()
+        now = time.time_ns() // 1000000
+        if now > self._last_ms:
+            self._last_ms = now
+            self._seq = 0
+            self._prefix = None
+        else:
+            # Same millisecond, or the clock stepped back: stay monotonic,
+            # borrowing the next millisecond once the sequence runs out
+            self._seq += 1
+            if self._seq >> _ORDER_ID_SEQ_BITS:
+                self._last_ms += 1
+                self._seq = 0
+                self._prefix = None
+        if self._prefix is None:
+            value = (self._last_ms << (_ORDER_ID_WORKER_BITS + _ORDER_ID_SEQ_BITS)) | self._worker_bits
+            self._prefix = _encode_order_id_value(value)[:-3]
+        seq = self._seq
+        return self._prefix + _B32HEX_PAIRS[seq >> 5] + _B32HEX[seq & 31]
+
+_worker_env = os.environ.get("ORDER_ID_WORKER")
+generate_order_id = OrderIdGenerator(int(_worker_env) if _worker_env else None)
+
+_ORDER_ID_MAX_MS = (1 << 48) - 1
+
+def order_id_bound(moment):
+    # Smallest possible order ID created at or after moment (a datetime).
+    # Times outside the ID's 48-bit millisecond range clamp to its ends.
+    ms = min(max(int(moment.timestamp() * 1000), 0), _ORDER_ID_MAX_MS)
+    return _encode_order_id_value(ms << (_ORDER_ID_WORKER_BITS + _ORDER_ID_SEQ_BITS))
+
+def order_id_time(order_id):
+    # Creation time of an ID from generate_order_id, or None for legacy IDs
+    # and anything else
+    if not isinstance(order_id, str) or not order_id.startswith(ORDER_ID_PREFIX):
+        return None
+    try:
+        value = int.from_bytes(base64.b32hexdecode(order_id[len(ORDER_ID_PREFIX):]), 'big')
+    except (ValueError, TypeError):
+        return None
+    return datetime.fromtimestamp((value >> (_ORDER_ID_WORKER_BITS + _ORDER_ID_SEQ_BITS)) / 1000)
+
+# Orders keyed by ID. Dicts keep insertion order, so the primary index
+# doubles as the display order while giving O(1) insert, lookup and delete.
+# Every insert also gets a sequence number; pagination cursors are sequence
+# numbers, so they stay valid while orders are added and deleted.
+#
+# Writers serialize on a lock. Readers never take it: they work from a
+# reference to the sequence log, which is only ever appended to in place or
+# swapped wholesale, so my_orders never blocks order intake. The sorted ID
+# index follows the same rule: IDs that arrive in order are appended, and
+# anything older (imports, replays) is merged into a fresh list.
+class OrderStore:
+    # Orders are lost on restart unless an OrderLog is attached
+    durable = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._orders = {}
+        self._by_phone = {}
+        self._by_pincode = {}
+        self._seq_by_id = {}
+        self._seq_log = ([], [])
+        self._next_seq = 1
+        # Every ID ever added, sorted; deleted IDs are dropped lazily
+        self._id_index = []
+
+    def _index_keys(self, order):
+        customer_info = order.get('customer_info') or {}
+        return customer_info.get('phone'), customer_info.get('pincode')
+
+    def add(self, order):
+        with self._lock:
+            return self._add_locked(order)
+
+    def add_many(self, orders):
+        # One lock acquisition, and at most one index merge, for a whole batch
+        with self._lock:
+            late_ids = []
+            for order in orders:
+                self._add_locked(order, late_ids)
+            if late_ids:
+                self._merge_ids(late_ids)
+
+    def _add_locked(self, order, late_ids=None):
+        order_id = order['id']
+        if order_id in self._orders:
+            self._delete_locked(order_id)
+        index = self._id_index
+        if not index or order_id > index[-1]:
+            index.append(order_id)
+        else:
+            i = bisect_left(index, order_id)
+            if i == len(index) or index[i] != order_id:
+                if late_ids is None:
+                    self._merge_ids([order_id])
+                else:
+                    late_ids.append(order_id)
+        seqs, seq_ids = self._seq_log
+        # Append the ID before the sequence number: readers bound their
+        # scan by len(seqs), so seq_ids is never shorter than that
+        seq_ids.append(order_id)
+        self._seq_by_id[order_id] = self._next_seq
+        self._orders[order_id] = order
+        seqs.append(self._next_seq)
+        self._next_seq += 1
+        phone, pincode = self._index_keys(order)
+        self._by_phone.setdefault(phone, {})[order_id] = order
+        self._by_pincode.setdefault(pincode, {})[order_id] = order
+        return order
+
+    def _merge_ids(self, order_ids):
+        # Readers may be bisecting the current index, so build a new one
+        merged = self._id_index + sorted(set(order_ids))
+        merged.sort()
+        self._id_index = merged
+
+    def get(self, order_id):
+        return self._orders.get(order_id)
+
+    def delete(self, order_id):
+        with self._lock:
+            return self._delete_locked(order_id)
+
+    def _delete_locked(self, order_id):
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return None
+        del self._seq_by_id[order_id]
+        # Deleted entries stay in the sequence log until it is mostly stale
+        if len(self._seq_log[0]) > 2 * len(self._orders) + 1024:
+            self._compact_sequence()
+        if len(self._id_index) > 2 * len(self._orders) + 1024:
+            self._id_index = [i for i in self._id_index if i in self._orders]
+        phone, pincode = self._index_keys(order)
+        for index, key in ((self._by_phone, phone), (self._by_pincode, pincode)):
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.pop(order_id, None)
+                if not bucket:
+                    del index[key]
+        return order
+
+    def _compact_sequence(self):
+        # Build a fresh log and publish it with a single assignment
+        seq_ids = list(self._orders)
+        self._seq_log = ([self._seq_by_id[order_id] for order_id in seq_ids], seq_ids)
+
+    def page(self, cursor=None, limit=50):
+        # Return up to limit orders inserted after cursor, plus the cursor for
+        # the next page (None once the end is reached).
+        seqs, seq_ids = self._seq_log
+        start = bisect_right(seqs, cursor) if cursor else 0
+        page = []
+        last_seq = None
+        for i in range(start, len(seqs)):
+            if len(page) == limit:
+                return page, last_seq
+            order_id = seq_ids[i]
+            seq = seqs[i]
+            if self._seq_by_id.get(order_id) == seq:
+                order = self._orders.get(order_id)
+                if order is not None:
+                    page.append(order)
+                    last_seq = seq
+        return page, None
+
+    def range_by_id(self, lo=None, hi=None):
+        # Orders with lo <= id < hi, in ID order. Order IDs sort by creation
+        # time, so this is also a time-range scan; it bisects the ID index.
+        index = self._id_index
+        start = bisect_left(index, lo) if lo is not None else 0
+        stop = bisect_left(index, hi) if hi is not None else len(index)
+        for i in range(start, stop):
+            order = self._orders.get(index[i])
+            if order is not None:
+                yield order
+
+    def iter_pages(self, page_size=100):
+        # Walk the whole store one page at a time without holding a live
+        # iterator over the underlying dict.
+        cursor = None
+        while True:
+            page, cursor = self.page(cursor, page_size)
+            yield from page
+            if cursor is None:
+                return
+
+    def by_phone(self, phone):
+        return list(self._by_phone.get(phone, {}).values())
+
+    def by_pincode(self, pincode):
+        return list(self._by_pincode.get(pincode, {}).values())
+
+    def clear(self):
+        with self._lock:
+            self._orders.clear()
+            self._by_phone.clear()
+            self._by_pincode.clear()
+            self._seq_by_id.clear()
+            self._seq_log = ([], [])
+            self._id_index = []
+
+    def __contains__(self, order_id):
+        return order_id in self._orders
+
+    def __iter__(self):
+        return self.iter_pages()
+
+    def __len__(self):
+        return len(self._orders)
+
+# SQLite-backed store with the same interface as OrderStore. Several worker
+# processes on one box can share it: the database runs in WAL mode so readers
+# never block the writer. Each thread reuses its own connection, and the
+# fixed SQL strings below hit sqlite3's per-connection statement cache.
+class SQLiteOrderStore:
+    durable = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS orders (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            timestamp TEXT NOT NULL,
+            phone TEXT,
+            pincode TEXT,
+            total NUMERIC NOT NULL,
+            customer_info TEXT NOT NULL,
+            extra TEXT
+        );
+        CREATE INDEX IF NOT EXISTS orders_timestamp ON orders (timestamp);
+        CREATE INDEX IF NOT EXISTS orders_pincode ON orders (pincode);
+        CREATE INDEX IF NOT EXISTS orders_phone ON orders (phone);
+        CREATE TABLE IF NOT EXISTS order_items (
+            order_seq INTEGER NOT NULL REFERENCES orders (seq) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            item_id TEXT,
+            name TEXT,
+            price NUMERIC,
+            quantity INTEGER,
+            PRIMARY KEY (order_seq, position)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS app_state (
+            key TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS deleted_orders (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL
+        );
+    """
+    INSERT_ORDER = "INSERT INTO orders (id, timestamp, phone, pincode, total, customer_info, extra) VALUES (?, ?, ?, ?, ?, ?, ?)"
+    INSERT_ITEM = "INSERT INTO order_items (order_seq, position, item_id, name, price, quantity) VALUES (?, ?, ?, ?, ?, ?)"
+    SELECT_ORDER = "SELECT seq, id, timestamp, total, customer_info, extra FROM orders"
+    # Top-level order fields with their own columns; anything else (such as
+    # delivery) round-trips through the extra JSON column
+    CORE_FIELDS = frozenset(['id', 'timestamp', 'items', 'customer_info', 'total'])
+    SELECT_ITEMS = "SELECT order_seq, item_id, name, price, quantity FROM order_items"
+    # Deletions are recorded for deleted_after; the oldest are pruned once
+    # there are more than this many
+    DELETIONS_KEPT = 100000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(self.SCHEMA)
+            # Databases created before the extra column existed
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(orders)")}
+            if 'extra' not in columns:
+                conn.execute("ALTER TABLE orders ADD COLUMN extra TEXT")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def close_connection(self):
+        # Connections must not be carried across fork; drop this thread's
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _load(self, rows):
+        # Attach line items with a range query when the rows are a contiguous
+        # run (pages), or with IN-list lookups when they are scattered
+        if not rows:
+            return []
+        orders_by_seq = {}
+        for seq, order_id, timestamp, total, customer_info, extra in rows:
+            order = {
+                'id': order_id,
+                'timestamp': timestamp,
+                'items': [],
+                'customer_info': json.loads(customer_info),
+                'total': total,
+            }
+            if extra:
+                order.update(json.loads(extra))
+            orders_by_seq[seq] = order
+        conn = self._connection()
+        seqs = list(orders_by_seq)
+        lo, hi = min(seqs), max(seqs)
+        if hi - lo < 2 * len(seqs):
+            queries = [(" WHERE order_seq BETWEEN ? AND ?", (lo, hi))]
+        else:
+            queries = [(" WHERE order_seq IN (" + ",".join("?" * len(chunk)) + ")", chunk)
+                       for chunk in (seqs[i:i + 500] for i in range(0, len(seqs), 500))]
+        for where, params in queries:
+            for seq, item_id, name, price, quantity in conn.execute(
+                    self.SELECT_ITEMS + where + " ORDER BY order_seq, position", params):
+                order = orders_by_seq.get(seq)
+                if order is not None:
+                    order['items'].append({'id': item_id, 'name': name, 'price': price, 'quantity': quantity})
+        return list(orders_by_seq.values())
+
+    def add(self, order):
+        conn = self._connection()
+        with conn:
+            self._insert(conn, order)
+        return order
+
+    def add_many(self, orders):
+        # One transaction, and so one commit, for a whole batch
+        conn = self._connection()
+        with conn:
+            for order in orders:
+                self._insert(conn, order)
+
+    def _insert(self, conn, order):
+        customer_info = order.get('customer_info') or {}
+        extra = {key: value for key, value in order.items() if key not in self.CORE_FIELDS}
+        conn.execute("DELETE FROM orders WHERE id = ?", (order['id'],))
+        seq = conn.execute(self.INSERT_ORDER, (
+            order['id'], order['timestamp'], customer_info.get('phone'), customer_info.get('pincode'),
+            order['total'], json.dumps(customer_info, separators=(',', ':')),
+            json.dumps(extra, separators=(',', ':')) if extra else None,
+        )).lastrowid
+        conn.executemany(self.INSERT_ITEM, [
+            (seq, position, item.get('id'), item.get('name'), item.get('price'), item.get('quantity'))
+            for position, item in enumerate(order['items'])
+        ])
+
+    def get(self, order_id):
+        rows = self._connection().execute(self.SELECT_ORDER + " WHERE id = ?", (order_id,)).fetchall()
+        loaded = self._load(rows)
+        return loaded[0] if loaded else None
+
+    def delete(self, order_id):
+        conn = self._connection()
+        order = self.get(order_id)
+        if order is None:
+            return None
+        with conn:
+            # Only the caller whose DELETE removed the row reports success
+            deleted = conn.execute("DELETE FROM orders WHERE id = ?", (order_id,)).rowcount
+            if deleted:
+                seq = conn.execute("INSERT INTO deleted_orders (id) VALUES (?)", (order_id,)).lastrowid
+                if seq % 1000 == 0:
+                    conn.execute("DELETE FROM deleted_orders WHERE seq <= ?", (seq - self.DELETIONS_KEPT,))
+        return order if deleted else None
+
+    def page(self, cursor=None, limit=50):
+        # Same cursor contract as OrderStore.page: cursors are sequence numbers
+        rows = self._connection().execute(
+            self.SELECT_ORDER + " WHERE seq > ? ORDER BY seq LIMIT ?", (cursor or 0, limit + 1)).fetchall()
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return self._load(rows[:limit]), next_cursor
+
+    def iter_pages(self, page_size=100):
+        cursor = None
+        while True:
+            page, cursor = self.page(cursor, page_size)
+            yield from page
+            if cursor is None:
+                return
+
+    def last_seq(self):
+        return self._connection().execute("SELECT COALESCE(MAX(seq), 0) FROM orders").fetchone()[0]
+
+    def added_after(self, seq, limit=500):
+        # Orders inserted (by any process) after seq, and the last seq seen
+        rows = self._connection().execute(
+            self.SELECT_ORDER + " WHERE seq > ? ORDER BY seq LIMIT ?", (seq, limit)).fetchall()
+        return self._load(rows), (rows[-1][0] if rows else seq)
+
+    def last_deleted_seq(self):
+        return self._connection().execute("SELECT COALESCE(MAX(seq), 0) FROM deleted_orders").fetchone()[0]
+
+    def deleted_after(self, seq, limit=500):
+        # IDs of orders deleted (by any process) after seq, and the last seq seen
+        rows = self._connection().execute(
+            "SELECT seq, id FROM deleted_orders WHERE seq > ? ORDER BY seq LIMIT ?", (seq, limit)).fetchall()
+        return [row[1] for row in rows], (rows[-1][0] if rows else seq)
+
+    def existing_ids(self, order_ids):
+        found = set()
+        conn = self._connection()
+        order_ids = list(order_ids)
+        for start in range(0, len(order_ids), 500):
+            chunk = order_ids[start:start + 500]
+            found.update(row[0] for row in conn.execute(
+                "SELECT id FROM orders WHERE id IN (" + ",".join("?" * len(chunk)) + ")", chunk))
+        return found
+
+    # Small shared documents (such as the dispatch schedule) for processes
+    # that use the same database; the version changes on every write
+    def get_state(self, key):
+        row = self._connection().execute("SELECT version, value FROM app_state WHERE key = ?", (key,)).fetchone()
+        return row if row is not None else (0, None)
+
+    def put_state(self, key, value):
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT INTO app_state (key, version, value) VALUES (?, 1, ?) "
+                         "ON CONFLICT (key) DO UPDATE SET version = version + 1, value = excluded.value",
+                         (key, value))
+
+    def range_by_id(self, lo=None, hi=None, batch_size=500):
+        # Walks the unique index on id, which sorts by creation time
+        last = None
+        while True:
+            clauses, params = [], []
+            if last is not None:
+                clauses.append("id > ?")
+                params.append(last)
+            elif lo is not None:
+                clauses.append("id >= ?")
+                params.append(lo)
+            if hi is not None:
+                clauses.append("id < ?")
+                params.append(hi)
+            where = " WHERE " + " AND ".join(clauses) if clauses else ""
+            rows = self._connection().execute(
+                self.SELECT_ORDER + where + " ORDER BY id LIMIT ?", params + [batch_size]).fetchall()
+            if not rows:
+                return
+            loaded = {order['id']: order for order in self._load(rows)}
+            for row in rows:
+                yield loaded[row[1]]
+            last = rows[-1][1]
+
+    def by_phone(self, phone):
+        return self._load(self._connection().execute(
+            self.SELECT_ORDER + " WHERE phone = ? ORDER BY seq", (phone,)).fetchall())
+
+    def by_pincode(self, pincode):
+        return self._load(self._connection().execute(
+            self.SELECT_ORDER + " WHERE pincode = ? ORDER BY seq", (pincode,)).fetchall())
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM orders")
+
+    def __contains__(self, order_id):
+        return self._connection().execute("SELECT 1 FROM orders WHERE id = ?", (order_id,)).fetchone() is not None
+
+    def __iter__(self):
+        return self.iter_pages()
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+# Select the order store backend: "memory" (default) or "sqlite"
+ORDER_STORE_BACKEND = os.environ.get("ORDER_STORE", "memory")
+ORDER_DB_PATH = os.environ.get("ORDER_DB_PATH", "orders.db")
+
+def create_order_store(backend=ORDER_STORE_BACKEND):
+    if backend == 'memory':
+        return OrderStore()
+    if backend == 'sqlite':
+        return SQLiteOrderStore(ORDER_DB_PATH)
+    raise ValueError(f"Unknown ORDER_STORE backend: {backend}")
 
 # Initialize orders storage
-orders = []
+orders = create_order_store()
+
+# Changes other processes make to a shared store. With the SQLite store each
+# process tails the orders added and deleted since it last looked, by
+# sequence number, and hands the ones it didn't make itself to its
+# subscribers, so per-process views such as the analytics projection follow
+# every worker's orders. Changes made here are noted before they are written
+# so the feed can recognise them. The feed thread starts lazily per process,
+# like the dispatch clock. There is no feed for the in-memory store.
+ORDER_FEED_SECONDS = float(os.environ.get("ORDER_FEED_SECONDS", 0.5))
+
+class OrderFeed:
+    def __init__(self, store, interval):
+        self.store = store
+        self.interval = interval
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._local_adds = set()
+        self._local_deletes = set()
+        self._seq = store.last_seq()
+        self._deleted_seq = store.last_deleted_seq()
+        self._pid = None
+
+    def subscribe(self, on_added, on_deleted):
+        # on_added(orders) and on_deleted(order_ids), from the feed thread
+        self._subscribers.append((on_added, on_deleted))
+
+    def note_local(self, added=(), deleted=()):
+        with self._lock:
+            self._local_adds.update(added)
+            self._local_deletes.update(deleted)
+
+    def drop_local(self, added=(), deleted=()):
+        # For changes noted but not made after all
+        with self._lock:
+            self._local_adds.difference_update(added)
+            self._local_deletes.difference_update(deleted)
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._run, name='order-feed', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error("Order feed failed: %s", e)
+
+    def poll(self):
+        # Deletions first, so an order deleted and then imported again ends
+        # up present
+        while True:
+            deleted, self._deleted_seq = self.store.deleted_after(self._deleted_seq)
+            if not deleted:
+                break
+            with self._lock:
+                remote = [order_id for order_id in deleted if order_id not in self._local_deletes]
+                self._local_deletes.difference_update(deleted)
+                # Added here and deleted before the feed saw the add
+                self._local_adds.difference_update(deleted)
+            if remote:
+                for _, on_deleted in self._subscribers:
+                    on_deleted(remote)
+        while True:
+            added, self._seq = self.store.added_after(self._seq)
+            if not added:
+                break
+            with self._lock:
+                remote = [order for order in added if order['id'] not in self._local_adds]
+                self._local_adds.difference_update(order['id'] for order in added)
+            if remote:
+                for on_added, _ in self._subscribers:
+                    on_added(remote)
+
+order_feed = OrderFeed(orders, ORDER_FEED_SECONDS) if isinstance(orders, SQLiteOrderStore) else None
+
+# Append-only write-ahead log of order puts and deletes. Appends are
+# buffered and a background thread writes and fsyncs them in batches (group
+# commit); callers block until their batch is durable. The log is compacted
+# into a snapshot once it grows past compact_after records.
+#
+# Callers log a change before applying it to the store (logged_puts and
+# logged_delete), so a change the log couldn't take never reaches the store.
+# If a write or fsync fails, the log is truncated back to the last good
+# record, the batch is dropped, and the callers waiting on it get an
+# OrderLogError instead of a false acknowledgement; later batches go on to
+# the next attempt as usual.
+class OrderLogError(Exception):
+    pass
+
+class OrderLog:
+    def __init__(self, directory, store, flush_interval=0.005, compact_after=100000, wait_for_sync=True,
+                 retry_interval=1.0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.log_path = os.path.join(directory, 'orders.log')
+        self.snapshot_path = os.path.join(directory, 'orders.snapshot')
+        self.store = store
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after
+        self.wait_for_sync = wait_for_sync
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._has_pending = threading.Condition(self._lock)
+        self._synced = threading.Condition(self._lock)
+        self._io_lock = threading.Lock()
+        self._pending = []
+        self._appended_seq = 0
+        self._synced_seq = 0
+        # (first, last, error) per recently failed batch
+        self._failures = deque(maxlen=1024)
+        # Sequence numbers of logged changes the store hasn't applied yet
+        self._unapplied = set()
+        self._applied = threading.Condition(self._lock)
+        # Length of the log before a failed write, to cut a torn record off
+        self._truncate_to = None
+        self._log_records = 0
+        self._file = None
+        self._thread = None
+        self._closed = False
+
+    def replay(self):
+        # Load the snapshot, then re-apply the log on top of it. Snapshot
+        # lines are parsed in chunks with one json.loads call per chunk, and
+        # the cyclic GC is paused since replay only allocates acyclic dicts.
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._replay()
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def _replay(self):
+        loaded = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                while True:
+                    chunk = [line for line in f.readlines(1 << 22) if line.strip()]
+                    if not chunk:
+                        break
+                    for order in json.loads('[' + ','.join(chunk) + ']'):
+                        self.store.add(order)
+                        loaded += 1
+
+        replayed = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn write from a crash can only be the final line
+                        logger.warning("Ignoring truncated order log record")
+                        break
+                    if record['op'] == 'put':
+                        self.store.add(record['order'])
+                    else:
+                        self.store.delete(record['id'])
+                    replayed += 1
+        self._log_records = replayed
+        return loaded, replayed
+
+    def start(self):
+        self._file = open(self.log_path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='order-log', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append_put(self, order):
+        self._append([{'op': 'put', 'order': order}])
+
+    def append_puts(self, orders):
+        # Waits for one sync covering the whole batch
+        self._append([{'op': 'put', 'order': order} for order in orders])
+
+    def append_delete(self, order_id):
+        self._append([{'op': 'del', 'id': order_id}])
+
+    def logged_puts(self, orders):
+        # Context manager around the store write: entering it logs the puts,
+        # and compaction waits for the block, so a snapshot never misses a
+        # change that is already in the log
+        return self._logged([{'op': 'put', 'order': order} for order in orders])
+
+    def logged_delete(self, order_id):
+        return self._logged([{'op': 'del', 'id': order_id}])
+
+    @contextlib.contextmanager
+    def _logged(self, records):
+        seq = self._append(records, hold=True)
+        try:
+            yield
+        finally:
+            self._release(seq)
+
+    def _release(self, seq):
+        with self._lock:
+            self._unapplied.discard(seq)
+            self._applied.notify_all()
+
+    def _append(self, records, hold=False):
+        lines = [json.dumps(record, separators=(',', ':')) + '\n' for record in records]
+        with self._lock:
+            self._pending.extend(lines)
+            self._appended_seq += len(lines)
+            seq = self._appended_seq
+            if hold:
+                self._unapplied.add(seq)
+            self._has_pending.notify()
+            if self.wait_for_sync:
+                while True:
+                    error = self._failure(seq)
+                    if error is not None:
+                        if hold:
+                            self._unapplied.discard(seq)
+                            self._applied.notify_all()
+                        raise OrderLogError(f"Order log write failed: {error}")
+                    if self._synced_seq >= seq or self._closed:
+                        break
+                    self._synced.wait()
+        return seq
+
+    def _failure(self, seq):
+        for first, last, error in self._failures:
+            if first <= seq <= last:
+                return error
+        return None
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._has_pending.wait()
+                if self._closed and not self._pending:
+                    return
+            # Let concurrent appends join this batch before paying for fsync
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                if self._log_records >= self.compact_after:
+                    self.compact()
+            except OSError as e:
+                logger.error("Order log write failed: %s", e)
+                if self._closed:
+                    return
+                time.sleep(self.retry_interval)
+
+    def flush(self):
+        with self._io_lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            batch_seq = self._appended_seq
+        if batch:
+            try:
+                self._reopen_if_needed()
+                offset = os.fstat(self._file.fileno()).st_size
+                try:
+                    self._file.write(''.join(batch))
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                except OSError:
+                    self._truncate_to = offset
+                    self._discard_file()
+                    # Cut the dropped batch off now if the disk lets us, so a
+                    # crash before the next write can't replay it
+                    with contextlib.suppress(OSError):
+                        self._reopen_if_needed()
+                    raise
+            except OSError as e:
+                with self._lock:
+                    # The callers apply nothing after an error, so the batch
+                    # is dropped rather than written on a later attempt
+                    self._failures.append((batch_seq - len(batch) + 1, batch_seq, e))
+                    self._synced.notify_all()
+                raise
+            self._log_records += len(batch)
+        with self._lock:
+            self._synced_seq = batch_seq
+            self._synced.notify_all()
+
+    def _reopen_if_needed(self):
+        # After a failed write: drop the torn tail, then reopen for appending
+        if self._truncate_to is not None:
+            os.truncate(self.log_path, self._truncate_to)
+            self._truncate_to = None
+        if self._file is None or self._file.closed:
+            self._file = open(self.log_path, 'a', encoding='utf-8')
+
+    def _discard_file(self):
+        # Closing flushes what's still buffered, which fails the same way
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        self._file = None
+
+    def compact(self):
+        # Replaying the log is idempotent, so an append that races with the
+        # snapshot is safe to appear both in the snapshot and the new log.
+        # Changes written by this flush but not applied yet would be in
+        # neither, so the snapshot waits for them.
+        with self._io_lock:
+            self._flush_locked()
+            with self._lock:
+                while any(seq <= self._synced_seq for seq in self._unapplied):
+                    self._applied.wait()
+            snapshot = list(self.store)
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for start in range(0, len(snapshot), 10000):
+                    f.write(''.join(json.dumps(order, separators=(',', ':')) + '\n'
+                                    for order in snapshot[start:start + 10000]))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            self._discard_file()
+            self._file = open(self.log_path, 'w', encoding='utf-8')
+            os.fsync(self._file.fileno())
+            self._fsync_directory()
+            self._log_records = 0
+            logger.info("Order log compacted into snapshot of %s orders", len(snapshot))
+
+    def _fsync_directory(self):
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._has_pending.notify()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+            # Don't leave a failed batch behind for the next replay
+            self._reopen_if_needed()
+        except OSError as e:
+            logger.error("Order log write failed on close: %s", e)
+        if self._file is not None:
+            self._discard_file()
+        with self._lock:
+            self._synced.notify_all()
+
+# Persist the in-memory store when ORDER_LOG_DIR is set; otherwise orders
+# live in memory only. Durable backends such as SQLite don't need the log.
+# The log serves the single-process development server; production serving
+# requires SQLite, since forked workers can't share one in-memory store.
+ORDER_LOG_DIR = os.environ.get("ORDER_LOG_DIR")
+order_log = None
+
+def open_order_log(directory=ORDER_LOG_DIR):
+    global order_log
+    if not directory or orders.durable:
+        return None
+    order_log = OrderLog(
+        directory, orders,
+        flush_interval=float(os.environ.get("ORDER_LOG_FLUSH_MS", 5)) / 1000,
+        compact_after=int(os.environ.get("ORDER_LOG_COMPACT_AFTER", 100000)),
+    )
+    start = time.perf_counter()
+    loaded, replayed = order_log.replay()
+    logger.info("Recovered %s orders (%s from snapshot, %s log records) in %.2fs",
+                len(orders), loaded, replayed, time.perf_counter() - start)
+    order_log.start()
+    return order_log
+
+open_order_log()
+
+# Pagination limits for /my-orders and /api/orders
+ORDERS_PAGE_SIZE = int(os.environ.get("ORDERS_PAGE_SIZE", 50))
+ORDERS_MAX_PAGE_SIZE = 500
+
+def parse_order_page_args():
+    # Raises ValueError for a malformed cursor or limit
+    cursor = request.args.get('cursor')
+    cursor = int(cursor) if cursor else None
+    limit = int(request.args.get('limit', ORDERS_PAGE_SIZE))
+    if limit < 1 or (cursor is not None and cursor < 0):
+        raise ValueError("cursor and limit must be positive")
+    return cursor, min(limit, ORDERS_MAX_PAGE_SIZE)
+
+# Lazily walks the order store for streamed rendering; truthiness matches
+# the store so templates can still test {% if orders %}.
+class StreamedOrders:
+    def __init__(self, store):
+        self._store = store
+
+    def __iter__(self):
+        return self._store.iter_pages()
+
+    def __bool__(self):
+        return len(self._store) > 0
+
+# Delivery zones: pincode -> zone, drone base, ETA and fee. Loaded from the
+# CSV file named by DELIVERY_ZONES_FILE (columns pincode, zone, drone_base,
+# eta_minutes, fee), falling back to the built-in zones below, into a frozen
+# dict so serviceability checks are a single hash lookup.
+DeliveryZone = namedtuple('DeliveryZone', ['pincode', 'zone', 'drone_base', 'eta_minutes', 'fee'])
+
+DEFAULT_DELIVERY_ZONES = [
+    DeliveryZone('591143', 'belagavi-rural', 'BGM-2', 35, 0),
+    DeliveryZone('591153', 'belagavi-rural', 'BGM-2', 35, 0),
+    DeliveryZone('590018', 'belagavi-north', 'BGM-1', 25, 0),
+    DeliveryZone('590006', 'belagavi-central', 'BGM-1', 20, 0),
+    DeliveryZone('590008', 'belagavi-south', 'BGM-1', 25, 0),
+]
+
+def load_delivery_zones(path=None):
+    path = path or os.environ.get("DELIVERY_ZONES_FILE")
+    if not path:
+        zones = DEFAULT_DELIVERY_ZONES
+    else:
+        with open(path, newline='', encoding='utf-8') as f:
+            zones = [DeliveryZone(row['pincode'].strip(), row['zone'], row['drone_base'],
+                                  int(row['eta_minutes']), int(row['fee']))
+                     for row in csv.DictReader(f)]
+    return MappingProxyType({zone.pincode: zone for zone in zones})
+
+DELIVERY_ZONES = load_delivery_zones()
 
 # Valid pincodes
-VALID_PINCODES = ['591143', '591153', '590018', '590006', '590008']
+VALID_PINCODES = tuple(DELIVERY_ZONES)
+
+# Serviceability answers are serialized once per pincode at startup
+_serviceability_responses = {
+    pincode: json.dumps({"pincode": pincode, "serviceable": True, "zone": zone.zone,
+                         "drone_base": zone.drone_base, "eta_minutes": zone.eta_minutes,
+                         "fee": zone.fee}, separators=(',', ':')).encode('utf-8')
+    for pincode, zone in DELIVERY_ZONES.items()
+}
+SERVICEABILITY_CACHE_CONTROL = os.environ.get("SERVICEABILITY_CACHE_CONTROL", "public, max-age=3600")
+
+@app.route('/api/serviceability/<pincode>')
+def serviceability(pincode):
+    body = _serviceability_responses.get(pincode)
+    if body is None:
+        body = json.dumps({"pincode": pincode[:10], "serviceable": False}, separators=(',', ':'))
+    return app.response_class(body, mimetype='application/json',
+                              headers={'Cache-Control': SERVICEABILITY_CACHE_CONTROL})
+
+# Order status push. Status changes (placed, dispatched, delivered, deleted)
+# are serialized once and fanned out to every Server-Sent Events subscriber's
+# buffer. Buffers are bounded: a subscriber that falls SSE_BUFFER_SIZE events
+# behind is told to resync instead of holding memory for it. Recent events are
+# kept so a reconnecting client can resume from its Last-Event-ID.
+#
+# Each worker process has its own subscribers and history. Every worker
+# publishes every event: departures and returns from the shared dispatch
+# schedule, and placements and deletions made in other workers from the
+# order feed (up to ORDER_FEED_SECONDS late). Event IDs are numbered per
+# process and carry its pid, so a client that reconnects to a different
+# worker is told to resync rather than resuming from a number that means
+# nothing there.
+SSE_BUFFER_SIZE = int(os.environ.get("SSE_BUFFER_SIZE", 256))
+SSE_HISTORY_SIZE = int(os.environ.get("SSE_HISTORY_SIZE", 1024))
+SSE_MAX_SUBSCRIBERS = int(os.environ.get("SSE_MAX_SUBSCRIBERS", 1000))
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+# Streams end after this long and the browser reconnects, so a request
+# thread is never held by one client indefinitely. How many streams a worker
+# can hold open depends on the worker class; see serve_production.
+SSE_MAX_SECONDS = float(os.environ.get("SSE_MAX_SECONDS", 300))
+SSE_RETRY_MS = int(os.environ.get("SSE_RETRY_MS", 3000))
+
+class OrderSubscriber:
+    __slots__ = ('buffer', 'size', 'ready', 'overflowed')
+
+    def __init__(self, size):
+        self.buffer = deque()
+        self.size = size
+        self.ready = threading.Event()
+        self.overflowed = False
+
+    def push(self, message):
+        if len(self.buffer) >= self.size:
+            self.overflowed = True
+            self.buffer.clear()
+        elif not self.overflowed:
+            self.buffer.append(message)
+        # Setting an Event takes its lock; skip it while the stream has not
+        # woken up for the previous event yet
+        if not self.ready.is_set():
+            self.ready.set()
+
+    def drain(self):
+        messages = []
+        while self.buffer:
+            messages.append(self.buffer.popleft())
+        return messages
+
+class OrderEvents:
+    def __init__(self, buffer_size, history_size, max_subscribers):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+
+    def publish(self, order_id, status, **details):
+        data = json.dumps(dict(order_id=order_id, status=status,
+                               at=datetime.now().isoformat(timespec='seconds'), **details),
+                          separators=(',', ':'))
+        with self._lock:
+            event_id = next(self._ids)
+            message = f"id: {os.getpid()}-{event_id}\nevent: status\ndata: {data}\n\n".encode('utf-8')
+            self._history.append((event_id, message))
+            for subscriber in self._subscribers:
+                subscriber.push(message)
+
+    def subscribe(self, last_event_id=None):
+        # last_event_id is the Last-Event-ID header of a reconnecting client.
+        # Returns None when the subscriber limit is reached.
+        subscriber = OrderSubscriber(self.buffer_size)
+        resume = None
+        if last_event_id:
+            pid, _, number = last_event_id.partition('-')
+            # -1 for an ID from another process: nothing can be replayed
+            resume = int(number) if pid == str(os.getpid()) and number.isdigit() else -1
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            if resume is not None:
+                if resume < 0 or (self._history and self._history[0][0] > resume + 1):
+                    # Some of the missed events are gone
+                    subscriber.overflowed = True
+                    subscriber.ready.set()
+                else:
+                    for event_id, message in self._history:
+                        if event_id > resume:
+                            subscriber.push(message)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+order_events = OrderEvents(SSE_BUFFER_SIZE, SSE_HISTORY_SIZE, SSE_MAX_SUBSCRIBERS)
+
+# Orders from the order feed that were created long before they were saved
+# are imports, which aren't announced in the worker that took them either
+SSE_FEED_MAX_AGE_SECONDS = 300
+
+def _announce_added(batch):
+    cutoff = datetime.now() - timedelta(seconds=SSE_FEED_MAX_AGE_SECONDS)
+    for order in batch:
+        created = order_id_time(order['id'])
+        if created is not None and created >= cutoff:
+            order_events.publish(order['id'], 'placed', total=order['total'])
+
+def _announce_deleted(order_ids):
+    for order_id in order_ids:
+        order_events.publish(order_id, 'deleted')
+
+if order_feed is not None:
+    order_feed.subscribe(_announce_added, _announce_deleted)
+
+def stream_order_events(subscriber):
+    deadline = time.monotonic() + SSE_MAX_SECONDS
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n".encode('utf-8')
+        while time.monotonic() < deadline:
+            # An idle stream just blocks here until an event or a heartbeat
+            if not subscriber.ready.wait(SSE_HEARTBEAT_SECONDS):
+                yield b": keepalive\n\n"
+                continue
+            subscriber.ready.clear()
+            if subscriber.overflowed:
+                yield b"event: resync\ndata: {}\n\n"
+                return
+            messages = subscriber.drain()
+            if messages:
+                yield b"".join(messages)
+    finally:
+        order_events.unsubscribe(subscriber)
+
+@app.route('/api/orders/events')
+def order_events_stream():
+    subscriber = order_events.subscribe(request.headers.get('Last-Event-ID'))
+    if subscriber is None:
+        response = jsonify({"error": "Too many open event streams, please retry"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    # Status changes from the dispatch schedule are only pushed while it is
+    # being advanced on a clock rather than on demand, and other workers'
+    # orders only while the feed runs
+    dispatch_scheduler.start_clock()
+    if order_feed is not None:
+        order_feed.start()
+    return app.response_class(stream_order_events(subscriber), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Drone dispatch. New orders join the open batch for their delivery zone; a
+# batch closes when the next order would exceed a drone's payload or when its
+# time window ends, and is then assigned to the drone at its zone's base that
+# frees up first (a heap per base keyed by availability). Arrivals and
+# deletions only touch one batch and one heap, so re-planning stays O(log
+# drones) instead of re-solving the whole schedule. At startup the schedule
+# is rebuilt by replaying the last DISPATCH_REBUILD_HOURS of orders at the
+# times they were placed. With the SQLite store, one process (whichever
+# holds a lock file) runs the schedule for every worker: it picks up orders
+# other workers saved, and publishes the schedule to the database for the
+# rest to read, so no two workers book the same drone.
+DISPATCH_WINDOW_SECONDS = float(os.environ.get("DISPATCH_WINDOW_SECONDS", 120))
+DRONES_PER_BASE = int(os.environ.get("DRONES_PER_BASE", 3))
+DRONE_PAYLOAD_ITEMS = int(os.environ.get("DRONE_PAYLOAD_ITEMS", 10))
+DRONE_BATTERY_MINUTES = float(os.environ.get("DRONE_BATTERY_MINUTES", 90))
+DRONE_RECHARGE_MINUTES = float(os.environ.get("DRONE_RECHARGE_MINUTES", 15))
+# Longest the dispatch clock sleeps between checks once it is running
+DISPATCH_TICK_SECONDS = float(os.environ.get("DISPATCH_TICK_SECONDS", 1))
+DISPATCH_REBUILD_HOURS = float(os.environ.get("DISPATCH_REBUILD_HOURS", 24))
+# How often workers exchange the shared schedule through the database
+DISPATCH_SYNC_SECONDS = float(os.environ.get("DISPATCH_SYNC_SECONDS", 0.5))
+
+class DispatchBatch:
+    __slots__ = ('id', 'zone', 'drone_base', 'trip_seconds', 'order_ids', 'payload',
+                 'close_at', 'status', 'drone_id', 'depart_at', 'return_at')
+
+    def __init__(self, batch_id, zone, close_at):
+        self.id = batch_id
+        self.zone = zone.zone
+        self.drone_base = zone.drone_base
+        # Out and back at the zone's ETA
+        self.trip_seconds = 2 * zone.eta_minutes * 60
+        self.order_ids = {}
+        self.payload = 0
+        self.close_at = close_at
+        self.status = 'open'
+        self.drone_id = None
+        self.depart_at = None
+        self.return_at = None
+
+    def to_dict(self):
+        def stamp(t):
+            return datetime.fromtimestamp(t).isoformat(timespec='seconds') if t else None
+        return {
+            'batch_id': self.id, 'zone': self.zone, 'drone_base': self.drone_base,
+            'status': self.status, 'drone_id': self.drone_id, 'payload': self.payload,
+            'orders': list(self.order_ids), 'depart_at': stamp(self.depart_at),
+            'return_at': stamp(self.return_at),
+        }
+
+class DispatchScheduler:
+    def __init__(self, zones, drones_per_base, payload_items, battery_minutes, recharge_minutes,
+                 window_seconds, clock=time.time, on_status=None):
+        self.payload_items = payload_items
+        self.battery_seconds = battery_minutes * 60
+        self.recharge_seconds = recharge_minutes * 60
+        self.window_seconds = window_seconds
+        self.clock = clock
+        # Called as on_status(order_id, status, **details) when a trip
+        # departs or comes back, with the scheduler lock held
+        self.on_status = on_status
+        self.drone_bases = sorted({zone.drone_base for zone in zones.values()})
+        self.drones_per_base = drones_per_base
+        self._lock = threading.Lock()
+        self._clock_pid = None
+        self._replaying = False
+        self._reset()
+
+    def _reset(self):
+        self._ids = itertools.count(1)
+        self._open = {}
+        self._closing = []
+        self._departing = []
+        self._returning = []
+        self._batches = {}
+        self._order_batch = {}
+        # drone base -> heap of (available_at, drone_id), and each drone's
+        # latest batch so a cancelled trip can hand its time back
+        self._drones = {}
+        self._last_batch = {}
+        for base in self.drone_bases:
+            self._drones[base] = [(0.0, f"{base}-D{i + 1}") for i in range(self.drones_per_base)]
+
+    def add_order(self, order, zone, now=None):
+        # Adding an order that is already on the schedule is a no-op.
+        # Returns the order's batch ID, or None if no drone can carry it.
+        payload = sum(item['quantity'] for item in order['items'])
+        if now is None:
+            now = self.clock()
+        with self._lock:
+            self._advance(now)
+            if order['id'] in self._order_batch:
+                return self._order_batch[order['id']]
+            batch = self._open.get(zone.zone)
+            if batch is not None and batch.payload + payload > self.payload_items:
+                self._close(batch, now)
+                batch = None
+            if batch is None:
+                batch = DispatchBatch(next(self._ids), zone, now + self.window_seconds)
+                self._batches[batch.id] = batch
+                self._open[zone.zone] = batch
+                heapq.heappush(self._closing, (batch.close_at, batch.id))
+            batch.order_ids[order['id']] = payload
+            batch.payload += payload
+            self._order_batch[order['id']] = batch.id
+            if batch.payload >= self.payload_items:
+                self._close(batch, now)
+            return self._order_batch.get(order['id'])
+
+    def remove_order(self, order_id):
+        now = self.clock()
+        with self._lock:
+            self._advance(now)
+            batch_id = self._order_batch.pop(order_id, None)
+            batch = self._batches.get(batch_id)
+            if batch is None or batch.status == 'dispatched':
+                return
+            batch.payload -= batch.order_ids.pop(order_id)
+            if not batch.order_ids:
+                self._cancel(batch)
+
+    def _close(self, batch, now):
+        # Assign a closed batch to the first drone at its base to free up
+        if self._open.get(batch.zone) is batch:
+            del self._open[batch.zone]
+        if batch.payload > self.payload_items or batch.trip_seconds > self.battery_seconds:
+            # No drone can ever fly it. Placement rejects such orders, so
+            # this is a replayed older order; drop the batch rather than
+            # keep it waiting forever.
+            logger.warning("Dropping batch %s for zone %s: %s items, %s minute trip",
+                           batch.id, batch.zone, batch.payload, batch.trip_seconds / 60)
+            del self._batches[batch.id]
+            for order_id in batch.order_ids:
+                self._order_batch.pop(order_id, None)
+            return
+        drones = self._drones.get(batch.drone_base)
+        available_at, drone_id = heapq.heappop(drones)
+        batch.drone_id = drone_id
+        batch.depart_at = max(now, available_at)
+        batch.return_at = batch.depart_at + batch.trip_seconds
+        batch.status = 'assigned'
+        self._last_batch[drone_id] = (batch.id, available_at)
+        heapq.heappush(drones, (batch.return_at + self.recharge_seconds, drone_id))
+        heapq.heappush(self._departing, (batch.depart_at, batch.id))
+
+    def _cancel(self, batch):
+        if batch.status == 'open':
+            del self._open[batch.zone]
+        elif batch.status == 'assigned' and self._last_batch.get(batch.drone_id, (None,))[0] == batch.id:
+            # Nothing was scheduled after this trip, so the drone frees up
+            # when it would have before the trip was assigned
+            _, previous_available = self._last_batch.pop(batch.drone_id)
+            drones = self._drones[batch.drone_base]
+            for i, (_, drone_id) in enumerate(drones):
+                if drone_id == batch.drone_id:
+                    drones[i] = (previous_available, drone_id)
+                    heapq.heapify(drones)
+                    break
+        batch.status = 'cancelled'
+        del self._batches[batch.id]
+
+    def _advance(self, now):
+        # Close batches whose window ended, mark departed trips, and forget
+        # trips whose drone is back
+        while self._closing and self._closing[0][0] <= now:
+            _, batch_id = heapq.heappop(self._closing)
+            batch = self._batches.get(batch_id)
+            if batch is not None and batch.status == 'open':
+                self._close(batch, now)
+        while self._departing and self._departing[0][0] <= now:
+            _, batch_id = heapq.heappop(self._departing)
+            batch = self._batches.get(batch_id)
+            if batch is not None and batch.status == 'assigned':
+                batch.status = 'dispatched'
+                heapq.heappush(self._returning, (batch.return_at, batch.id))
+                self._notify(batch, 'dispatched')
+        while self._returning and self._returning[0][0] <= now:
+            _, batch_id = heapq.heappop(self._returning)
+            batch = self._batches.pop(batch_id, None)
+            if batch is not None:
+                for order_id in batch.order_ids:
+                    self._order_batch.pop(order_id, None)
+                self._notify(batch, 'delivered')
+
+    def rebuild(self, orders, zones):
+        # Start over from orders (oldest first), each added at the time it
+        # was placed. Nothing is announced: it all happened before.
+        with self._lock:
+            self._reset()
+            self._replaying = True
+        try:
+            for order in orders:
+                zone = zones.get((order.get('customer_info') or {}).get('pincode'))
+                try:
+                    placed = datetime.strptime(order['timestamp'], "%Y-%m-%d %H:%M:%S").timestamp()
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if zone is not None:
+                    self.add_order(order, zone, now=placed)
+            with self._lock:
+                self._advance(self.clock())
+        finally:
+            self._replaying = False
+
+    def pending_order_ids(self):
+        # Orders on batches that haven't left yet, which a deletion still affects
+        with self._lock:
+            return [order_id for order_id, batch_id in self._order_batch.items()
+                    if self._batches[batch_id].status != 'dispatched']
+
+    def _notify(self, batch, status):
+        if self.on_status is None or self._replaying:
+            return
+        for order_id in batch.order_ids:
+            self.on_status(order_id, status, zone=batch.zone, drone_id=batch.drone_id)
+
+    def start_clock(self):
+        # Advance the schedule from a background thread, sleeping until the
+        # next deadline, so departures and returns are noticed (and pushed)
+        # without waiting for the next request. Started lazily per process.
+        if self._clock_pid == os.getpid():
+            return
+        with self._lock:
+            if self._clock_pid == os.getpid():
+                return
+            threading.Thread(target=self._run_clock, name='dispatch-clock', daemon=True).start()
+            self._clock_pid = os.getpid()
+
+    def _run_clock(self):
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._advance(now)
+                deadlines = [heap[0][0] for heap in (self._closing, self._departing, self._returning)
+                             if heap]
+            delay = min(deadlines) - now if deadlines else DISPATCH_TICK_SECONDS
+            time.sleep(min(max(delay, 0.01), DISPATCH_TICK_SECONDS))
+
+    def assignments(self, include_dispatched=False):
+        with self._lock:
+            self._advance(self.clock())
+            return [batch.to_dict() for batch in self._batches.values()
+                    if include_dispatched or batch.status != 'dispatched']
+
+    def batch_for_order(self, order_id):
+        with self._lock:
+            self._advance(self.clock())
+            batch = self._batches.get(self._order_batch.get(order_id))
+            return batch.to_dict() if batch is not None else None
+
+    def order_status(self, order_id):
+        # 'placed' or 'dispatched' for orders on the schedule, else None
+        with self._lock:
+            self._advance(self.clock())
+            batch = self._batches.get(self._order_batch.get(order_id))
+            if batch is None:
+                return None
+            return 'dispatched' if batch.status == 'dispatched' else 'placed'
+
+def rebuild_dispatch_schedule(scheduler, store, hours=DISPATCH_REBUILD_HOURS):
+    since = order_id_bound(datetime.now() - timedelta(hours=hours))
+    start = time.perf_counter()
+    scheduler.rebuild(store.range_by_id(since), DELIVERY_ZONES)
+    logger.info("Rebuilt dispatch schedule (%s batches) in %.2fs",
+                len(scheduler.assignments(include_dispatched=True)), time.perf_counter() - start)
+
+# The schedule shared by processes on one SQLite database. The process that
+# holds lock_path runs the real DispatchScheduler: it tails new orders by
+# sequence number, drops orders that were deleted before their trip left,
+# and writes the schedule to the database. The others read it from there and
+# announce departures and returns to their own event streams. When the
+# leader exits, the lock is released and the next process to try takes
+# over, rebuilding the schedule from the orders table.
+class SharedDispatch:
+    STATE_KEY = 'dispatch'
+
+    def __init__(self, scheduler, store, zones, lock_path, sync_seconds, on_status=None):
+        self.scheduler = scheduler
+        self.store = store
+        self.zones = zones
+        self.lock_path = lock_path
+        self.sync_seconds = sync_seconds
+        self.on_status = on_status
+        self._lock = threading.Lock()
+        self._pid = None
+        self._lock_file = None
+        self._leader = False
+        self._seq = 0
+        self._published = None
+        # A follower's copy of the schedule, swapped wholesale on each sync
+        self._version = 0
+        self._batches = []
+        self._order_batch = {}
+
+    def start_clock(self):
+        # Started lazily per process, like the scheduler's own clock
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._lock_file = None
+            self._leader = False
+            self._version = 0
+            if not self._try_lead():
+                self._load_state()
+            threading.Thread(target=self._run, name='dispatch-sync', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _try_lead(self):
+        lock_file = open(self.lock_path, 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+        self._lock_file = lock_file
+        self._seq = self.store.last_seq()
+        rebuild_dispatch_schedule(self.scheduler, self.store)
+        self._leader = True
+        self._published = None
+        self.scheduler.start_clock()
+        self._publish()
+        logger.info("Running the dispatch schedule for all workers")
+        return True
+
+    def _run(self):
+        while True:
+            time.sleep(self.sync_seconds)
+            try:
+                if self._leader:
+                    self._sync_orders()
+                    self._publish()
+                elif not self._try_lead():
+                    self._load_state()
+            except (sqlite3.Error, OSError) as e:
+                logger.error("Dispatch sync failed: %s", e)
+
+    def _sync_orders(self):
+        while True:
+            added, self._seq = self.store.added_after(self._seq)
+            for order in added:
+                zone = self.zones.get((order.get('customer_info') or {}).get('pincode'))
+                if zone is not None:
+                    self.scheduler.add_order(order, zone)
+            if not added:
+                break
+        pending = self.scheduler.pending_order_ids()
+        if pending:
+            for order_id in set(pending) - self.store.existing_ids(pending):
+                self.scheduler.remove_order(order_id)
+
+    def _publish(self):
+        body = json.dumps(self.scheduler.assignments(include_dispatched=True), separators=(',', ':'))
+        if body != self._published:
+            self.store.put_state(self.STATE_KEY, body)
+            self._published = body
+
+    def _load_state(self):
+        version, body = self.store.get_state(self.STATE_KEY)
+        if version == self._version:
+            return
+        batches = json.loads(body) if body else []
+        order_batch = {order_id: batch for batch in batches for order_id in batch['orders']}
+        previous, announce = self._order_batch, self._version != 0
+        self._batches, self._order_batch, self._version = batches, order_batch, version
+        if not announce or self.on_status is None:
+            return
+        for order_id, batch in order_batch.items():
+            before = previous.get(order_id)
+            if batch['status'] == 'dispatched' and (before is None or before['status'] != 'dispatched'):
+                self.on_status(order_id, 'dispatched', zone=batch['zone'], drone_id=batch['drone_id'])
+        for order_id, batch in previous.items():
+            if batch['status'] == 'dispatched' and order_id not in order_batch:
+                self.on_status(order_id, 'delivered', zone=batch['zone'], drone_id=batch['drone_id'])
+
+    # The DispatchScheduler interface. Orders reach the leader through the
+    # database; the leader also applies its own process's changes at once.
+    def add_order(self, order, zone):
+        self.start_clock()
+        if self._leader:
+            return self.scheduler.add_order(order, zone)
+        return None
+
+    def remove_order(self, order_id):
+        self.start_clock()
+        if self._leader:
+            self.scheduler.remove_order(order_id)
+
+    def assignments(self, include_dispatched=False):
+        self.start_clock()
+        if self._leader:
+            return self.scheduler.assignments(include_dispatched)
+        return [batch for batch in self._batches if include_dispatched or batch['status'] != 'dispatched']
+
+    def batch_for_order(self, order_id):
+        self.start_clock()
+        if self._leader:
+            return self.scheduler.batch_for_order(order_id)
+        return self._order_batch.get(order_id)
+
+    def order_status(self, order_id):
+        self.start_clock()
+        if self._leader:
+            return self.scheduler.order_status(order_id)
+        batch = self._order_batch.get(order_id)
+        if batch is None:
+            return None
+        return 'dispatched' if batch['status'] == 'dispatched' else 'placed'
+
+def create_dispatch_scheduler():
+    scheduler = DispatchScheduler(
+        DELIVERY_ZONES, DRONES_PER_BASE, DRONE_PAYLOAD_ITEMS, DRONE_BATTERY_MINUTES,
+        DRONE_RECHARGE_MINUTES, DISPATCH_WINDOW_SECONDS, on_status=order_events.publish)
+    if isinstance(orders, SQLiteOrderStore):
+        return SharedDispatch(scheduler, orders, DELIVERY_ZONES, ORDER_DB_PATH + '.dispatch-lock',
+                              DISPATCH_SYNC_SECONDS, on_status=order_events.publish)
+    # The in-memory store only ever has one process
+    rebuild_dispatch_schedule(scheduler, orders)
+    return scheduler
+
+dispatch_scheduler = create_dispatch_scheduler()
+
+@app.route('/api/dispatch')
+def dispatch_assignments():
+    include_dispatched = request.args.get('all') == '1'
+    return jsonify({"batches": dispatch_scheduler.assignments(include_dispatched)})
+
+@app.route('/api/dispatch/order/<order_id>')
+def dispatch_for_order(order_id):
+    batch = dispatch_scheduler.batch_for_order(order_id)
+    if batch is None:
+        return jsonify({"error": "Order is not scheduled"}), 404
+    return jsonify(batch)
 
 @app.route('/')
 def index():
-    logger.debug("Serving index page")
-    return render_template('index.html')
+    return serve_static_page('index.html')
 
 @app.route('/menu')
 def menu():
@@ -88,63 +2186,1246 @@ def menu():
 
 @app.route('/checkout')
 def checkout():
-    logger.debug("Loading checkout page")
-    return render_template('checkout.html')
+    return serve_static_page('checkout.html')
 
 @app.route('/my-orders')
 def my_orders():
     logger.debug("Loading orders page")
-    return render_template('my-orders.html', orders=orders)
+    if request.args.get('stream'):
+        # Stream the full history; the first bytes go out before all orders render
+        template = get_template('my-orders.html')
+        return app.response_class(
+            stream_with_context(template.generate(orders=StreamedOrders(orders),
+                                                  order_status=dispatch_scheduler.order_status)),
+            mimetype='text/html')
+
+    try:
+        cursor, limit = parse_order_page_args()
+    except ValueError:
+        return "Invalid pagination parameters", 400
+    with phase('order_page'):
+        page, next_cursor = orders.page(cursor, limit)
+    return render_template('my-orders.html', orders=page, next_cursor=next_cursor, limit=limit,
+                           order_status=dispatch_scheduler.order_status)
+
+@app.route('/api/orders')
+def list_orders():
+    try:
+        cursor, limit = parse_order_page_args()
+    except ValueError:
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+    with phase('order_page'):
+        page, next_cursor = orders.page(cursor, limit)
+    return jsonify({
+        "orders": page,
+        "next_cursor": str(next_cursor) if next_cursor is not None else None,
+    })
 
 @app.route('/confirmation')
 def confirmation():
-    logger.debug("Loading confirmation page")
-    return render_template('confirmation.html')
+    return serve_static_page('confirmation.html')
+
+# Order payload validation. compile_validator() turns a schema into nested
+# closures once at startup; running one checks types, lengths and bounds in
+# a single pass and returns a cleaned copy holding only the known fields,
+# along with a list of {"field", "message"} errors.
+MAX_ORDER_BYTES = 64 * 1024
+MAX_CART_LINES = 50
+MAX_ITEM_QUANTITY = 50
+MAX_VALIDATION_ERRORS = 20
+
+app.config['MAX_CONTENT_LENGTH'] = MAX_ORDER_BYTES
+
+class OrderValidationError(ValueError):
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details or []
+
+def _child_path(path, name):
+    return f"{path}.{name}" if path else name
+
+def compile_validator(schema):
+    kind = schema['type']
+
+    if kind == 'object':
+        fields = [(name, compile_validator(sub), sub.get('required', False))
+                  for name, sub in schema['fields'].items()]
+
+        def validate(value, errors, path):
+            if type(value) is not dict:
+                errors.append({'field': path, 'message': 'must be an object'})
+                return None
+            cleaned = {}
+            for name, check, required in fields:
+                if name in value:
+                    cleaned[name] = check(value[name], errors, _child_path(path, name))
+                elif required:
+                    errors.append({'field': _child_path(path, name), 'message': 'is required'})
+            return cleaned
+        return validate
+
+    if kind == 'array':
+        check_item = compile_validator(schema['items'])
+        min_items = schema.get('min_items', 0)
+        max_items = schema.get('max_items')
+
+        def validate(value, errors, path):
+            if type(value) is not list:
+                errors.append({'field': path, 'message': 'must be an array'})
+                return None
+            if len(value) < min_items:
+                errors.append({'field': path, 'message': f'must have at least {min_items} entries'})
+            # Reject oversized arrays before looking at any element
+            if max_items is not None and len(value) > max_items:
+                errors.append({'field': path, 'message': f'must have at most {max_items} entries'})
+                return None
+            return [check_item(item, errors, f"{path}[{i}]") for i, item in enumerate(value)]
+        return validate
+
+    if kind == 'string':
+        min_length = schema.get('min_length', 0)
+        max_length = schema['max_length']
+
+        def validate(value, errors, path):
+            if type(value) is not str:
+                errors.append({'field': path, 'message': 'must be a string'})
+            elif not min_length <= len(value) <= max_length:
+                errors.append({'field': path, 'message': f'must be {min_length}-{max_length} characters'})
+            return value
+        return validate
+
+    if kind in ('integer', 'number'):
+        types = (int,) if kind == 'integer' else (int, float)
+        minimum = schema.get('minimum')
+        maximum = schema.get('maximum')
+
+        def validate(value, errors, path):
+            # type() rather than isinstance() so booleans are rejected
+            if type(value) not in types:
+                errors.append({'field': path, 'message': f'must be an {kind}' if kind == 'integer' else 'must be a number'})
+            elif (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+                errors.append({'field': path, 'message': f'must be between {minimum} and {maximum}'})
+            return value
+        return validate
+
+    raise ValueError(f"Unknown schema type: {kind}")
+
+ORDER_SCHEMA = {
+    'type': 'object',
+    'fields': {
+        'customerInfo': {'type': 'object', 'required': True, 'fields': {
+            'name': {'type': 'string', 'required': True, 'min_length': 1, 'max_length': 100},
+            'email': {'type': 'string', 'max_length': 254},
+            'phone': {'type': 'string', 'required': True, 'min_length': 1, 'max_length': 20},
+            'address': {'type': 'string', 'required': True, 'min_length': 1, 'max_length': 500},
+            'pincode': {'type': 'string', 'required': True, 'max_length': 10},
+            'notes': {'type': 'string', 'max_length': 500},
+        }},
+        'items': {'type': 'array', 'required': True, 'min_items': 1, 'max_items': MAX_CART_LINES, 'items': {
+            'type': 'object', 'fields': {
+                'id': {'type': 'string', 'required': True, 'min_length': 1, 'max_length': 32},
+                'quantity': {'type': 'integer', 'required': True, 'minimum': 1, 'maximum': MAX_ITEM_QUANTITY},
+                # Sent by the browser cart; ignored in favour of menu prices
+                'name': {'type': 'string', 'max_length': 200},
+                'price': {'type': 'number'},
+            },
+        }},
+        # Checkout from a server-side cart sends this instead of items
+        'cartId': {'type': 'string', 'max_length': 64},
+    },
+}
+
+_validate_order = compile_validator(ORDER_SCHEMA)
+
+def validate_order_payload(order_data):
+    # Returns the cleaned payload or raises OrderValidationError
+    errors = []
+    cleaned = _validate_order(order_data, errors, '')
+    if errors:
+        raise OrderValidationError("Invalid order data", errors[:MAX_VALIDATION_ERRORS])
+    return cleaned
+
+@app.errorhandler(413)
+def payload_too_large(error):
+    # Batch and import endpoints raise the limit for their own requests
+    return jsonify({"error": f"Request body exceeds {request.max_content_length} bytes"}), 413
+
+@app.errorhandler(OrderLogError)
+def order_log_failed(error):
+    logger.error("%s", error)
+    return jsonify({"error": "Order could not be saved durably, please retry"}), 500
+
+def order_error_response(error):
+    body = {"error": str(error)}
+    if isinstance(error, OrderValidationError) and error.details:
+        body["details"] = error.details
+    return jsonify(body), 400
+
+def build_order(order_data, for_delivery=True):
+    # Validate and price an order payload. Raises ValueError with a message
+    # that is safe to return to the client.
+    order = price_order(order_data, for_delivery)
+    # Add timestamp and order ID
+    order['id'] = generate_order_id()
+    order['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return order
+
+def price_order(order_data, for_delivery=True):
+    # Everything build_order does except assigning the ID and timestamp.
+    # Orders for delivery must fit one drone trip; imported records needn't.
+    order_data = validate_order_payload(order_data)
+    zone = DELIVERY_ZONES.get(order_data['customerInfo']['pincode'])
+    if zone is None:
+        raise ValueError("Delivery not available in this area")
+    if for_delivery and 2 * zone.eta_minutes > DRONE_BATTERY_MINUTES:
+        raise ValueError("Delivery not available in this area")
+
+    # Price the order from the menu index rather than trusting the client
+    items, total = price_order_items(order_data['items'])
+    if for_delivery and sum(item['quantity'] for item in items) > DRONE_PAYLOAD_ITEMS:
+        raise OrderValidationError("Invalid order data", [{
+            "field": "items",
+            "message": f"at most {DRONE_PAYLOAD_ITEMS} items in total, the most one drone can carry",
+        }])
+    return {
+        'id': None,
+        'timestamp': None,
+        'items': items,
+        'customer_info': order_data['customerInfo'],
+        'delivery': {'zone': zone.zone, 'drone_base': zone.drone_base,
+                     'eta_minutes': zone.eta_minutes, 'fee': zone.fee},
+        'total': total + zone.fee
+    }
+
+def build_orders(payloads):
+    # build_order for a batch: each payload is validated and priced, then
+    # the valid ones share one timestamp and one bulk ID allocation. Returns
+    # (orders, errors), aligned with payloads, with None in the slot that
+    # doesn't apply.
+    built = []
+    errors = []
+    for payload in payloads:
+        try:
+            built.append(price_order(payload))
+            errors.append(None)
+        except ValueError as e:
+            built.append(None)
+            errors.append(e)
+    valid = [order for order in built if order is not None]
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for order, order_id in zip(valid, generate_order_id.many(len(valid))):
+        order['id'] = order_id
+        order['timestamp'] = timestamp
+    return built, errors
+
+def _logged_puts(batch):
+    if order_log is None:
+        return contextlib.nullcontext()
+    return order_log.logged_puts(batch)
+
+@contextlib.contextmanager
+def _local_change(added=(), deleted=()):
+    # Lets the order feed tell this process's own writes apart; on failure
+    # the note is withdrawn
+    if order_feed is None:
+        yield
+        return
+    order_feed.note_local(added, deleted)
+    try:
+        yield
+    except BaseException:
+        order_feed.drop_local(added, deleted)
+        raise
+
+def save_order(order):
+    # Logged first: an order the log couldn't take is never stored
+    with _local_change(added=[order['id']]), _logged_puts([order]):
+        orders.add(order)
+    if ANALYTICS_ENABLED:
+        order_analytics.add(order)
+    _schedule_and_announce(order)
+
+def save_orders(batch):
+    # save_order for a batch: one store write (one transaction for SQLite)
+    # and one order log sync
+    with _local_change(added=[order['id'] for order in batch]), _logged_puts(batch):
+        orders.add_many(batch)
+    if ANALYTICS_ENABLED:
+        order_analytics.add_many(batch)
+    for order in batch:
+        _schedule_and_announce(order)
+
+def _schedule_and_announce(order):
+    zone = DELIVERY_ZONES.get(order['customer_info'].get('pincode'))
+    if zone is not None:
+        dispatch_scheduler.add_order(order, zone)
+    order_events.publish(order['id'], 'placed', total=order['total'])
+
+def remove_order(order_id):
+    # Returns the deleted order, or None if there was no such order
+    if order_feed is not None:
+        with _local_change(deleted=[order_id]):
+            order = orders.delete(order_id)
+        if order is None:
+            order_feed.drop_local(deleted=[order_id])
+    elif order_log is None:
+        order = orders.delete(order_id)
+    elif order_id in orders:
+        with order_log.logged_delete(order_id):
+            order = orders.delete(order_id)
+    else:
+        order = None
+    if order is not None:
+        dispatch_scheduler.remove_order(order_id)
+        if ANALYTICS_ENABLED:
+            order_analytics.remove(order_id)
+        order_events.publish(order_id, 'deleted')
+    return order
+
+# Bulk export and import as JSON Lines (one order per line). Export streams
+# from the order store's ID index, so ?since=/&until= (ISO datetimes) are
+# range scans and memory use doesn't grow with the number of orders. Import
+# reads the body a line at a time, validates each line like a placed order,
+# and writes valid orders in batches of ORDER_IMPORT_BATCH_SIZE.
+ORDER_EXPORT_CHUNK = int(os.environ.get("ORDER_EXPORT_CHUNK", 100))
+ORDER_IMPORT_BATCH_SIZE = int(os.environ.get("ORDER_IMPORT_BATCH_SIZE", 500))
+ORDER_IMPORT_MAX_BYTES = int(os.environ.get("ORDER_IMPORT_MAX_BYTES", 256 * 1024 * 1024))
+MAX_IMPORT_ERRORS = 100
+
+def parse_time_range_args():
+    # (lo, hi) order ID bounds from ?since= and ?until=; raises ValueError
+    bounds = []
+    for name in ('since', 'until'):
+        value = request.args.get(name)
+        try:
+            bounds.append(order_id_bound(datetime.fromisoformat(value)) if value else None)
+        except (OverflowError, OSError):
+            # timestamp() can't represent the datetime on this platform
+            raise ValueError(f"{name} is out of range")
+    return tuple(bounds)
+
+def _in_time_range(order_id, lo, hi):
+    return (lo is None or order_id >= lo) and (hi is None or order_id < hi)
+
+@app.route('/api/orders/export')
+def export_orders():
+    try:
+        lo, hi = parse_time_range_args()
+    except ValueError:
+        return jsonify({"error": "since and until must be ISO 8601 datetimes"}), 400
+
+    def generate():
+        chunk = []
+        for order in orders.range_by_id(lo, hi):
+            chunk.append(json.dumps(order, separators=(',', ':')))
+            if len(chunk) == ORDER_EXPORT_CHUNK:
+                chunk.append('')
+                yield '\n'.join(chunk)
+                chunk = []
+        if chunk:
+            chunk.append('')
+            yield '\n'.join(chunk)
+
+    return app.response_class(generate(), mimetype='application/x-ndjson',
+                              headers={'Content-Disposition': 'attachment; filename="orders.ndjson"'})
+
+def build_imported_order(line):
+    # Lines are place-order payloads. Lines from an export are accepted too:
+    # their customer_info is validated as customerInfo, and a time-sortable
+    # ID is kept (with its timestamp) so re-importing an export is idempotent.
+    if not isinstance(line, dict):
+        raise ValueError("Each line must be a JSON object")
+    order_id = line.get('id')
+    if 'customerInfo' not in line and 'customer_info' in line:
+        line = dict(line, customerInfo=line['customer_info'])
+    order = build_order(line, for_delivery=False)
+    if order_id is not None:
+        created = order_id_time(order_id)
+        if created is None or len(order_id) != len(order['id']):
+            raise OrderValidationError("Invalid order data", [{"field": "id", "message": "not a valid order ID"}])
+        order['id'] = order_id
+        order['timestamp'] = created.strftime("%Y-%m-%d %H:%M:%S")
+    return order
+
+def save_imported_orders(batch):
+    # Imported orders are records from other systems: they are stored and
+    # logged, but not scheduled for delivery or announced to status streams
+    with _local_change(added=[order['id'] for order in batch]), _logged_puts(batch):
+        orders.add_many(batch)
+    if ANALYTICS_ENABLED:
+        order_analytics.add_many(batch)
+
+@app.route('/api/orders/import', methods=['POST'])
+def import_orders():
+    try:
+        lo, hi = parse_time_range_args()
+    except ValueError:
+        return jsonify({"error": "since and until must be ISO 8601 datetimes"}), 400
+    # The body is read a line at a time, so it may be far larger than a
+    # single order
+    request.max_content_length = ORDER_IMPORT_MAX_BYTES
+
+    imported = skipped = failed = 0
+    errors = []
+    batch = []
+    batch_ids = set()
+    first_id = last_id = None
+    stream = request.stream
+    line_number = 0
+    while True:
+        raw = stream.readline(MAX_ORDER_BYTES + 1)
+        if not raw:
+            break
+        line_number += 1
+        try:
+            if len(raw) > MAX_ORDER_BYTES:
+                # Skip the rest of an oversized line without buffering it
+                while raw and not raw.endswith(b'\n'):
+                    raw = stream.readline(MAX_ORDER_BYTES)
+                raise ValueError(f"Line exceeds {MAX_ORDER_BYTES} bytes")
+            if not raw.strip():
+                continue
+            try:
+                line = json.loads(raw)
+            except ValueError:
+                raise ValueError("Line is not valid JSON")
+            order = build_imported_order(line)
+        except ValueError as e:
+            failed += 1
+            if len(errors) < MAX_IMPORT_ERRORS:
+                error = {"line": line_number, "error": str(e)}
+                if isinstance(e, OrderValidationError) and e.details:
+                    error["details"] = e.details
+                errors.append(error)
+            continue
+
+        if not _in_time_range(order['id'], lo, hi) or order['id'] in batch_ids or order['id'] in orders:
+            skipped += 1
+            continue
+        batch.append(order)
+        batch_ids.add(order['id'])
+        if first_id is None:
+            first_id = order['id']
+        last_id = order['id']
+        if len(batch) == ORDER_IMPORT_BATCH_SIZE:
+            save_imported_orders(batch)
+            imported += len(batch)
+            batch = []
+            batch_ids.clear()
+    if batch:
+        save_imported_orders(batch)
+        imported += len(batch)
+
+    logger.info("Imported %s orders (%s skipped, %s failed)", imported, skipped, failed)
+    return jsonify({"imported": imported, "skipped": skipped, "failed": failed, "errors": errors,
+                    "first_order_id": first_id, "last_order_id": last_id})
+
+# Order analytics. A columnar projection of the order store: one typed array
+# column per field (time, total, pincode code, cart quantity) indexed by row,
+# plus one row per order line (order row, item code, quantity, revenue). It
+# is updated as orders are saved and removed; deletes only clear the row's
+# live flag until half the rows are dead, and then a background thread
+# rebuilds the columns from a snapshot and swaps them in, replaying whatever
+# changed while it worked, so intake never waits on a rebuild. Columns grow in fixed-size chunks
+# and a full chunk is never written again, so a query only copies the live
+# flags and each column's last chunk under the lock and aggregates outside
+# it, with NumPy when it is installed and plain loops otherwise. The
+# projection is per process; with several workers on SQLite each one also
+# applies the orders the others add and delete, from the order feed, so all
+# workers answer over the same orders, give or take ORDER_FEED_SECONDS.
+ANALYTICS_ENABLED = os.environ.get("ANALYTICS_ENABLED", "1") != "0"
+ANALYTICS_CHUNK_ROWS = 65536
+
+class ChunkedColumn:
+    # typecode None makes a column of arbitrary objects, in list chunks
+    __slots__ = ('typecode', 'chunks')
+
+    def __init__(self, typecode):
+        self.typecode = typecode
+        self.chunks = [self._chunk()]
+
+    def _chunk(self):
+        return array(self.typecode) if self.typecode is not None else []
+
+    def append(self, value):
+        tail = self.chunks[-1]
+        if len(tail) == ANALYTICS_CHUNK_ROWS:
+            tail = self._chunk()
+            self.chunks.append(tail)
+        tail.append(value)
+
+    def __getitem__(self, index):
+        return self.chunks[index // ANALYTICS_CHUNK_ROWS][index % ANALYTICS_CHUNK_ROWS]
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.chunks)
+
+    def __len__(self):
+        return (len(self.chunks) - 1) * ANALYTICS_CHUNK_ROWS + len(self.chunks[-1])
+
+    def snapshot(self):
+        # The full chunks are shared as they are; only the tail is copied
+        return self.chunks[:-1] + [self.chunks[-1][:]]
+
+def _column_array(chunks):
+    # One NumPy array from a column snapshot
+    parts = [numpy.frombuffer(chunk, dtype=chunk.typecode) for chunk in chunks if len(chunk)]
+    if not parts:
+        return numpy.empty(0, dtype=chunks[0].typecode)
+    return numpy.concatenate(parts) if len(parts) > 1 else parts[0]
+
+class OrderAnalytics:
+    TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+    MAX_CACHED_TIMESTAMPS = 4096
+    ROW_COLUMNS = (('time', 'd'), ('total', 'd'), ('pincode', 'H'), ('quantity', 'L'))
+    LINE_COLUMNS = (('line_row', 'L'), ('line_item', 'H'), ('line_quantity', 'L'), ('line_revenue', 'd'))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timestamps = {}
+        self._pincode_codes = {}
+        self._pincode_names = []
+        self._item_codes = {}
+        self._item_names = []
+        self._generation = 0
+        self._compacting = False
+        # Rows removed while a compaction runs, or None when none is running
+        self._removed_rows = None
+        self._reset()
+
+    def _reset(self):
+        self._rows = {}
+        self._columns = self._new_columns()
+        self._row_ids = ChunkedColumn(None)
+        self._live = bytearray()
+        self._dead = 0
+        # Tells a running compaction that its snapshot no longer applies
+        self._generation += 1
+
+    def _new_columns(self):
+        return {name: ChunkedColumn(typecode) for name, typecode in self.ROW_COLUMNS + self.LINE_COLUMNS}
+
+    def _epoch(self, timestamp):
+        # Orders placed together share a timestamp string, so parses are cached
+        epoch = self._timestamps.get(timestamp)
+        if epoch is None:
+            if len(self._timestamps) >= self.MAX_CACHED_TIMESTAMPS:
+                self._timestamps.clear()
+            epoch = self._timestamps[timestamp] = datetime.strptime(timestamp, self.TIMESTAMP_FORMAT).timestamp()
+        return epoch
+
+    @staticmethod
+    def _code(codes, names, key):
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = len(names)
+            names.append(key)
+        return code
+
+    def add(self, order):
+        with self._lock:
+            self._add_locked(order)
+
+    def add_many(self, orders):
+        with self._lock:
+            for order in orders:
+                self._add_locked(order)
+
+    def _add_locked(self, order):
+        if order['id'] in self._rows:
+            self._remove_locked(order['id'])
+        columns = self._columns
+        row = len(self._live)
+        quantity = 0
+        for item in order['items']:
+            columns['line_row'].append(row)
+            columns['line_item'].append(self._code(self._item_codes, self._item_names, item.get('id')))
+            columns['line_quantity'].append(item['quantity'])
+            columns['line_revenue'].append(item['price'] * item['quantity'])
+            quantity += item['quantity']
+        pincode = (order.get('customer_info') or {}).get('pincode')
+        columns['time'].append(self._epoch(order['timestamp']))
+        columns['total'].append(order['total'])
+        columns['pincode'].append(self._code(self._pincode_codes, self._pincode_names, pincode))
+        columns['quantity'].append(quantity)
+        self._row_ids.append(order['id'])
+        self._live.append(1)
+        self._rows[order['id']] = row
+
+    def remove(self, order_id):
+        with self._lock:
+            self._remove_locked(order_id)
+            if not self._compacting and self._dead > 1024 and self._dead * 2 > len(self._live):
+                self._compacting = True
+                threading.Thread(target=self._compact, name='analytics-compact', daemon=True).start()
+
+    def _remove_locked(self, order_id):
+        row = self._rows.pop(order_id, None)
+        if row is not None:
+            self._live[row] = 0
+            self._dead += 1
+            if self._removed_rows is not None:
+                self._removed_rows.append(row)
+
+    def _compact(self):
+        # Rebuild every column from the live rows. The lock is only held to
+        # snapshot the columns and, at the end, to catch up with the rows
+        # added and removed meanwhile and swap the new columns in. Snapshots
+        # taken by queries keep the old chunks, which are left untouched.
+        try:
+            with self._lock:
+                generation = self._generation
+                old = {name: column.snapshot() for name, column in self._columns.items()}
+                old_ids = self._row_ids.snapshot()
+                old_live = bytes(self._live)
+                self._removed_rows = []
+            columns = self._new_columns()
+            row_ids = ChunkedColumn(None)
+            live = bytearray()
+            rows = {}
+            renumbered = array('l', [-1]) * len(old_live)
+            row_names = [name for name, _ in self.ROW_COLUMNS]
+            for row, (flag, order_id, *values) in enumerate(zip(
+                    old_live, itertools.chain.from_iterable(old_ids),
+                    *(itertools.chain.from_iterable(old[name]) for name in row_names))):
+                if flag:
+                    renumbered[row] = rows[order_id] = len(live)
+                    for name, value in zip(row_names, values):
+                        columns[name].append(value)
+                    row_ids.append(order_id)
+                    live.append(1)
+            line_names = [name for name, _ in self.LINE_COLUMNS]
+            old_lines = sum(len(chunk) for chunk in old['line_row'])
+            for row, *values in zip(*(itertools.chain.from_iterable(old[name]) for name in line_names)):
+                new_row = renumbered[row]
+                if new_row >= 0:
+                    columns['line_row'].append(new_row)
+                    for name, value in zip(line_names[1:], values):
+                        columns[name].append(value)
+
+            with self._lock:
+                if self._generation != generation:
+                    return
+                for row in self._removed_rows:
+                    if row < len(old_live) and renumbered[row] >= 0:
+                        live[renumbered[row]] = 0
+                        rows.pop(self._row_ids[row], None)
+                # Rows (and their lines) added since the snapshot
+                for row in range(len(old_live), len(self._live)):
+                    renumbered.append(len(live))
+                    order_id = self._row_ids[row]
+                    if self._live[row]:
+                        rows[order_id] = len(live)
+                    for name in row_names:
+                        columns[name].append(self._columns[name][row])
+                    row_ids.append(order_id)
+                    live.append(self._live[row])
+                for i in range(old_lines, len(self._columns['line_row'])):
+                    columns['line_row'].append(renumbered[self._columns['line_row'][i]])
+                    for name in line_names[1:]:
+                        columns[name].append(self._columns[name][i])
+                self._columns, self._row_ids, self._live, self._rows = columns, row_ids, live, rows
+                self._dead = live.count(0)
+        finally:
+            with self._lock:
+                self._compacting = False
+                self._removed_rows = None
+
+    def rebuild(self, orders):
+        with self._lock:
+            self._reset()
+            for order in orders:
+                self._add_locked(order)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _snapshot(self, *names, lines=False):
+        # Chunk lists for the named row columns (and with lines=True the
+        # order-line columns), plus copies of the live flags and code names
+        if lines:
+            names += tuple(name for name, _ in self.LINE_COLUMNS)
+        with self._lock:
+            columns = {name: self._columns[name].snapshot() for name in names}
+            columns['live'] = bytes(self._live)
+            columns['pincode_names'] = list(self._pincode_names)
+            columns['item_names'] = list(self._item_names)
+        return columns
+
+    @staticmethod
+    def _selected_rows(columns, since, until):
+        # Row mask (NumPy) or sequence of flags: live and, if given, since <= time < until
+        if numpy is not None:
+            selected = numpy.frombuffer(columns['live'], dtype=numpy.uint8).astype(bool)
+            if since is not None or until is not None:
+                times = _column_array(columns['time'])
+                if since is not None:
+                    selected &= times >= since
+                if until is not None:
+                    selected &= times < until
+            return selected
+        live = columns['live']
+        if since is None and until is None:
+            return live
+        low = since if since is not None else float('-inf')
+        high = until if until is not None else float('inf')
+        return [flag and low <= t < high
+                for flag, t in zip(live, itertools.chain.from_iterable(columns['time']))]
+
+    def revenue_by_hour(self, since=None, until=None):
+        # [(hour start epoch, revenue, orders)] for hours with orders
+        columns = self._snapshot('time', 'total')
+        selected = self._selected_rows(columns, since, until)
+        if numpy is not None:
+            hours = (_column_array(columns['time'])[selected] // 3600).astype(numpy.int64)
+            if not hours.size:
+                return []
+            first = hours.min()
+            offsets = hours - first
+            revenue = numpy.bincount(offsets, weights=_column_array(columns['total'])[selected])
+            counts = numpy.bincount(offsets)
+            return [(int(first + i) * 3600, float(revenue[i]), int(counts[i])) for i in numpy.flatnonzero(counts)]
+        buckets = {}
+        for flag, t, total in zip(selected, itertools.chain.from_iterable(columns['time']),
+                                  itertools.chain.from_iterable(columns['total'])):
+            if flag:
+                bucket = buckets.setdefault(int(t // 3600), [0.0, 0])
+                bucket[0] += total
+                bucket[1] += 1
+        return [(hour * 3600, revenue, count) for hour, (revenue, count) in sorted(buckets.items())]
+
+    def top_items(self, limit=10, since=None, until=None):
+        # [(item id, quantity, revenue)] by quantity sold, highest first
+        columns = self._snapshot('time', lines=True)
+        selected = self._selected_rows(columns, since, until)
+        names = columns['item_names']
+        if numpy is not None:
+            keep = selected[_column_array(columns['line_row'])]
+            items = _column_array(columns['line_item'])[keep]
+            quantity = numpy.bincount(items, minlength=len(names),
+                                      weights=_column_array(columns['line_quantity'])[keep])
+            revenue = numpy.bincount(items, minlength=len(names),
+                                     weights=_column_array(columns['line_revenue'])[keep])
+            ranked = numpy.argsort(-quantity, kind='stable')[:limit]
+            return [(names[code], int(quantity[code]), float(revenue[code])) for code in ranked if quantity[code] > 0]
+        quantity = [0] * len(names)
+        revenue = [0.0] * len(names)
+        for row, item, count, amount in zip(*(itertools.chain.from_iterable(columns[name])
+                                              for name, _ in self.LINE_COLUMNS)):
+            if selected[row]:
+                quantity[item] += count
+                revenue[item] += amount
+        ranked = sorted(range(len(names)), key=lambda code: -quantity[code])[:limit]
+        return [(names[code], quantity[code], revenue[code]) for code in ranked if quantity[code] > 0]
+
+    def cart_size(self, since=None, until=None):
+        # (orders, average items per order, average order total)
+        columns = self._snapshot('time', 'total', 'quantity')
+        selected = self._selected_rows(columns, since, until)
+        if numpy is not None:
+            orders_count = int(selected.sum())
+            if not orders_count:
+                return 0, 0.0, 0.0
+            return (orders_count, float(_column_array(columns['quantity'])[selected].mean()),
+                    float(_column_array(columns['total'])[selected].mean()))
+        orders_count = items = 0
+        revenue = 0.0
+        for flag, quantity, total in zip(selected, itertools.chain.from_iterable(columns['quantity']),
+                                         itertools.chain.from_iterable(columns['total'])):
+            if flag:
+                orders_count += 1
+                items += quantity
+                revenue += total
+        if not orders_count:
+            return 0, 0.0, 0.0
+        return orders_count, items / orders_count, revenue / orders_count
+
+    def by_pincode(self, since=None, until=None):
+        # [(pincode, orders, revenue)] by order count, highest first
+        columns = self._snapshot('time', 'total', 'pincode')
+        selected = self._selected_rows(columns, since, until)
+        names = columns['pincode_names']
+        if numpy is not None:
+            codes = _column_array(columns['pincode'])[selected]
+            counts = numpy.bincount(codes, minlength=len(names))
+            revenue = numpy.bincount(codes, minlength=len(names), weights=_column_array(columns['total'])[selected])
+            stats = [(names[code], int(counts[code]), float(revenue[code])) for code in numpy.flatnonzero(counts)]
+        else:
+            counts = [0] * len(names)
+            revenue = [0.0] * len(names)
+            for flag, code, total in zip(selected, itertools.chain.from_iterable(columns['pincode']),
+                                         itertools.chain.from_iterable(columns['total'])):
+                if flag:
+                    counts[code] += 1
+                    revenue[code] += total
+            stats = [(names[code], counts[code], revenue[code]) for code in range(len(names)) if counts[code]]
+        return sorted(stats, key=lambda stat: -stat[1])
+
+order_analytics = OrderAnalytics()
+if ANALYTICS_ENABLED:
+    order_analytics.rebuild(orders)
+
+def _analytics_added(batch):
+    order_analytics.add_many(batch)
+
+def _analytics_deleted(order_ids):
+    for order_id in order_ids:
+        order_analytics.remove(order_id)
+
+if ANALYTICS_ENABLED and order_feed is not None:
+    order_feed.subscribe(_analytics_added, _analytics_deleted)
+
+def parse_analytics_range():
+    # (since, until) epoch seconds from ISO datetimes; raises ValueError
+    try:
+        return tuple(datetime.fromisoformat(request.args[name]).timestamp() if request.args.get(name) else None
+                     for name in ('since', 'until'))
+    except (OverflowError, OSError):
+        raise ValueError("since or until is out of range")
+
+def analytics_response(query):
+    if not ANALYTICS_ENABLED:
+        return jsonify({"error": "Analytics are disabled"}), 404
+    if order_feed is not None:
+        order_feed.start()
+    try:
+        since, until = parse_analytics_range()
+    except ValueError:
+        return jsonify({"error": "since and until must be ISO 8601 datetimes"}), 400
+    return jsonify(query(since, until))
+
+@app.route('/api/analytics/revenue')
+def analytics_revenue():
+    return analytics_response(lambda since, until: {"hours": [
+        {"hour": datetime.fromtimestamp(hour).isoformat(timespec='minutes'), "revenue": revenue, "orders": count}
+        for hour, revenue, count in order_analytics.revenue_by_hour(since, until)
+    ]})
+
+@app.route('/api/analytics/top-items')
+def analytics_top_items():
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 100)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return analytics_response(lambda since, until: {"items": [
+        {"id": item_id, "name": MENU_INDEX.get(item_id, {}).get('name'), "quantity": quantity, "revenue": revenue}
+        for item_id, quantity, revenue in order_analytics.top_items(limit, since, until)
+    ]})
+
+@app.route('/api/analytics/cart-size')
+def analytics_cart_size():
+    def query(since, until):
+        count, average_items, average_total = order_analytics.cart_size(since, until)
+        return {"orders": count, "average_items": average_items, "average_total": average_total}
+    return analytics_response(query)
+
+@app.route('/api/analytics/pincodes')
+def analytics_pincodes():
+    return analytics_response(lambda since, until: {"pincodes": [
+        {"pincode": pincode, "orders": count, "revenue": revenue}
+        for pincode, count, revenue in order_analytics.by_pincode(since, until)
+    ]})
+
+# Server-side carts. Each cart is two parallel arrays, menu item IDs and
+# quantities, rather than a list of item dicts; names and prices come from
+# the menu index when the cart is read. Carts live in an LRU keyed by a
+# random cart ID held in the session cookie. Carts idle for CART_TTL_SECONDS
+# are evicted, and at most MAX_CARTS are kept.
+CART_TTL_SECONDS = int(os.environ.get("CART_TTL_SECONDS", 2 * 60 * 60))
+MAX_CARTS = int(os.environ.get("MAX_CARTS", 100000))
+
+class Cart:
+    __slots__ = ('item_ids', 'quantities', 'touched')
+
+    def __init__(self, now):
+        self.item_ids = []
+        self.quantities = array('H')
+        self.touched = now
+
+    def add(self, item_id, quantity):
+        # Raises ValueError when the cart or the line would grow past limits
+        if item_id in self.item_ids:
+            i = self.item_ids.index(item_id)
+            if self.quantities[i] + quantity > MAX_ITEM_QUANTITY:
+                raise ValueError(f"At most {MAX_ITEM_QUANTITY} of an item per order")
+            self.quantities[i] += quantity
+        else:
+            if len(self.item_ids) >= MAX_CART_LINES:
+                raise ValueError(f"At most {MAX_CART_LINES} different items per order")
+            self.item_ids.append(item_id)
+            self.quantities.append(quantity)
+
+    def remove(self, item_id, quantity=None):
+        if item_id not in self.item_ids:
+            return
+        i = self.item_ids.index(item_id)
+        if quantity is None or self.quantities[i] <= quantity:
+            del self.item_ids[i]
+            del self.quantities[i]
+        else:
+            self.quantities[i] -= quantity
+
+    def order_items(self):
+        # Lines in the shape /api/place-order accepts
+        return [{'id': item_id, 'quantity': quantity}
+                for item_id, quantity in zip(self.item_ids, self.quantities)]
+
+    def to_dict(self, cart_id):
+        lines = []
+        total = 0
+        for item_id, quantity in zip(self.item_ids, self.quantities):
+            item = MENU_INDEX.get(item_id)
+            if item is None:
+                continue
+            lines.append({'id': item_id, 'name': item['name'], 'price': item['price'],
+                          'quantity': quantity, 'line_total': item['price'] * quantity})
+            total += item['price'] * quantity
+        return {'cart_id': cart_id, 'items': lines, 'total': total}
+
+class CartStore:
+    def __init__(self, ttl_seconds, max_carts, clock=time.time):
+        self.ttl_seconds = ttl_seconds
+        self.max_carts = max_carts
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._carts = OrderedDict()
+
+    def _evict(self, now):
+        # Least recently used carts sit at the front
+        carts = self._carts
+        while carts:
+            cart_id, cart = next(iter(carts.items()))
+            if len(carts) <= self.max_carts and now - cart.touched < self.ttl_seconds:
+                break
+            del carts[cart_id]
+
+    def get(self, cart_id, create=False):
+        now = self.clock()
+        with self._lock:
+            self._evict(now)
+            cart = self._carts.get(cart_id) if cart_id else None
+            if cart is None:
+                if not create:
+                    return None, None
+                cart_id = secrets.token_urlsafe(16)
+                cart = self._carts[cart_id] = Cart(now)
+            else:
+                self._carts.move_to_end(cart_id)
+            cart.touched = now
+            self._evict(now)
+            return cart_id, cart
+
+    def discard(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+    def __len__(self):
+        return len(self._carts)
+
+cart_store = CartStore(CART_TTL_SECONDS, MAX_CARTS)
+
+def _session_cart(create=False):
+    cart_id, cart = cart_store.get(session.get('cart_id'), create=create)
+    if cart_id is not None and session.get('cart_id') != cart_id:
+        session['cart_id'] = cart_id
+    return cart_id, cart
+
+def _cart_line_args():
+    data = request.get_json(silent=True) or {}
+    item_id = data.get('id')
+    quantity = data.get('quantity', 1)
+    if item_id not in MENU_INDEX:
+        raise ValueError("Unknown menu item")
+    if type(quantity) is not int or not 1 <= quantity <= MAX_ITEM_QUANTITY:
+        raise ValueError(f"quantity must be between 1 and {MAX_ITEM_QUANTITY}")
+    return item_id, quantity
+
+@app.route('/api/cart')
+def get_cart():
+    cart_id, cart = _session_cart()
+    if cart is None:
+        return jsonify({'cart_id': None, 'items': [], 'total': 0})
+    return jsonify(cart.to_dict(cart_id))
+
+@app.route('/api/cart/add', methods=['POST'])
+def add_to_cart():
+    try:
+        item_id, quantity = _cart_line_args()
+        cart_id, cart = _session_cart(create=True)
+        cart.add(item_id, quantity)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(cart.to_dict(cart_id))
+
+@app.route('/api/cart/remove', methods=['POST'])
+def remove_from_cart():
+    data = request.get_json(silent=True) or {}
+    quantity = data.get('quantity')
+    if quantity is not None and (type(quantity) is not int or quantity < 1):
+        return jsonify({"error": "quantity must be a positive integer"}), 400
+    cart_id, cart = _session_cart()
+    if cart is None:
+        return jsonify({'cart_id': None, 'items': [], 'total': 0})
+    cart.remove(data.get('id'), quantity)
+    return jsonify(cart.to_dict(cart_id))
+
+def resolve_cart(order_data):
+    # For payloads without items, fill them in from the referenced (or the
+    # session's) server-side cart. Returns the payload and the cart ID used.
+    if type(order_data) is not dict or 'items' in order_data:
+        return order_data, None
+    cart_id = order_data.get('cartId') or session.get('cart_id')
+    cart_id, cart = cart_store.get(cart_id if isinstance(cart_id, str) else None)
+    if cart is None:
+        return order_data, None
+    return dict(order_data, items=cart.order_items()), cart_id
 
 @app.route('/api/place-order', methods=['POST'])
 def place_order():
     try:
-        order_data = request.json
+        with phase('parse_json'):
+            order_data = request.get_json(silent=True)
         if not order_data:
             logger.error("No order data received")
             return jsonify({"error": "No order data provided"}), 400
 
-        # Validate pincode
-        pincode = order_data['customerInfo'].get('pincode')
-        if not pincode or pincode not in VALID_PINCODES:
-            logger.error(f"Invalid pincode: {pincode}")
-            return jsonify({"error": "Delivery not available in this area"}), 400
-
-        # Add timestamp and order ID
-        order = {
-            'id': generate_order_id(),
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'items': order_data['items'],
-            'customer_info': order_data['customerInfo'],
-            'total': sum(item['price'] * item['quantity'] for item in order_data['items'])
-        }
-        orders.append(order)
-        logger.info(f"New order created: {order['id']}")
+        order_data, cart_id = resolve_cart(order_data)
+        try:
+            with phase('build_order'):
+                order = build_order(order_data)
+        except ValueError as e:
+            logger.error("Rejected order: %s", e)
+            return order_error_response(e)
+
+        with phase('save_order'):
+            save_order(order)
+        if cart_id is not None:
+            cart_store.discard(cart_id)
+        logger.info("New order created: %s", order['id'])
         return jsonify({"success": True, "order_id": order['id']})
+    except (HTTPException, OrderLogError):
+        raise
+    except Exception as e:
+        logger.error("Error processing order: %s", e)
+        return jsonify({"error": "Failed to process order"}), 500
+
+# Batch placement for partner integrations: a JSON array of place-order
+# payloads in one request. With ?atomic=1 nothing is placed unless every
+# order is valid; otherwise valid orders are placed and invalid ones
+# reported. results is aligned with the request: {"order_id"} for a placed
+# order, {"error"[, "details"]} for an invalid one, and null for a valid
+# order held back by an atomic failure.
+MAX_BATCH_ORDERS = int(os.environ.get("MAX_BATCH_ORDERS", 500))
+MAX_BATCH_BYTES = int(os.environ.get("MAX_BATCH_BYTES", 4 * 1024 * 1024))
+
+def _order_result(order, error):
+    if error is None:
+        return {"order_id": order['id']}
+    result = {"error": str(error)}
+    if isinstance(error, OrderValidationError) and error.details:
+        result["details"] = error.details
+    return result
+
+@app.route('/api/place-orders', methods=['POST'])
+def place_orders():
+    request.max_content_length = MAX_BATCH_BYTES
+    try:
+        payloads = request.get_json(silent=True)
+        if not isinstance(payloads, list) or not payloads:
+            return jsonify({"error": "Expected a non-empty JSON array of orders"}), 400
+        if len(payloads) > MAX_BATCH_ORDERS:
+            return jsonify({"error": f"At most {MAX_BATCH_ORDERS} orders per batch"}), 400
+        atomic = request.args.get('atomic') == '1'
+
+        built, errors = build_orders(payloads)
+        failed = sum(error is not None for error in errors)
+        if atomic and failed:
+            logger.error("Rejected order batch: %s of %s orders invalid", failed, len(payloads))
+            return jsonify({"placed": 0, "failed": failed, "results": [
+                _order_result(order, error) if error is not None else None
+                for order, error in zip(built, errors)
+            ]}), 400
+
+        batch = [order for order in built if order is not None]
+        if batch:
+            save_orders(batch)
+        logger.info("Order batch placed: %s orders, %s rejected", len(batch), failed)
+        return jsonify({"placed": len(batch), "failed": failed,
+                        "results": [_order_result(order, error) for order, error in zip(built, errors)]})
+    except (HTTPException, OrderLogError):
+        raise
+    except Exception as e:
+        logger.error("Error processing order batch: %s", e)
+        return jsonify({"error": "Failed to process orders"}), 500
+
+# Asynchronous intake: validated orders go onto a bounded queue and a pool of
+# worker threads persists them, so request latency doesn't include
+# persistence cost. A full queue is reported as 429 instead of queueing
+# without bound. Workers start lazily so each forked process gets its own,
+# and a process drains its queue before it exits (at interpreter exit, and
+# from gunicorn's worker_exit hook when a worker is retired), for up to
+# ORDER_INTAKE_DRAIN_SECONDS.
+#
+# The queue and the queued/failed statuses belong to the process that took
+# the order. Once saved, an order is 'confirmed' from any worker, since the
+# status falls back to the shared store; until then, and for a failure,
+# /api/order-status/<id> on another worker answers 404. Clients should
+# treat a 404 shortly after a 202 as "not confirmed yet" and poll again.
+ORDER_INTAKE_QUEUE_SIZE = int(os.environ.get("ORDER_INTAKE_QUEUE_SIZE", 1000))
+ORDER_INTAKE_WORKERS = int(os.environ.get("ORDER_INTAKE_WORKERS", 4))
+ORDER_INTAKE_DRAIN_SECONDS = float(os.environ.get("ORDER_INTAKE_DRAIN_SECONDS", 20))
+
+class OrderIntake:
+    # Statuses of orders not yet confirmed; confirmed orders are answered
+    # from the order store, and failures are remembered up to max_failures
+    def __init__(self, save, queue_size, workers, max_failures=10000):
+        self.save = save
+        self.queue = queue.Queue(queue_size)
+        self.workers = workers
+        self.max_failures = max_failures
+        self._lock = threading.Lock()
+        self._statuses = {}
+        self._failures = {}
+        self._pid = None
+
+    def _ensure_workers(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f'order-intake-{i}', daemon=True).start()
+            self._pid = os.getpid()
+        atexit.register(self.drain)
+
+    def submit(self, order):
+        # Returns False when the queue is full
+        self._ensure_workers()
+        self._statuses[order['id']] = 'queued'
+        try:
+            self.queue.put_nowait(order)
+        except queue.Full:
+            del self._statuses[order['id']]
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            order = self.queue.get()
+            try:
+                self.save(order)
+                logger.info("New order created: %s", order['id'])
+            except Exception as e:
+                logger.error("Error persisting order %s: %s", order['id'], e)
+                with self._lock:
+                    self._failures[order['id']] = str(e)
+                    if len(self._failures) > self.max_failures:
+                        del self._failures[next(iter(self._failures))]
+            finally:
+                self._statuses.pop(order['id'], None)
+                self.queue.task_done()
+
+    def status(self, order_id):
+        status = self._statuses.get(order_id)
+        if status is not None:
+            return status
+        if order_id in orders:
+            return 'confirmed'
+        # Check the failures last: a worker records the failure before it
+        # clears the queued status
+        if order_id in self._failures:
+            return 'failed'
+        return None
+
+    def join(self):
+        self.queue.join()
+
+    def drain(self, timeout=ORDER_INTAKE_DRAIN_SECONDS):
+        # Wait for this process's queued orders to be saved. Returns False
+        # if some were still unsaved after timeout seconds.
+        if self._pid != os.getpid():
+            return True
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.error("Exiting with %s queued orders unsaved", self.queue.unfinished_tasks)
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+order_intake = OrderIntake(save_order, ORDER_INTAKE_QUEUE_SIZE, ORDER_INTAKE_WORKERS)
+
+@app.route('/api/place-order-async', methods=['POST'])
+def place_order_async():
+    try:
+        order_data = request.get_json(silent=True)
+        if not order_data:
+            return jsonify({"error": "No order data provided"}), 400
+        order_data, cart_id = resolve_cart(order_data)
+        try:
+            order = build_order(order_data)
+        except ValueError as e:
+            logger.error("Rejected order: %s", e)
+            return order_error_response(e)
+
+        if not order_intake.submit(order):
+            logger.warning("Order intake queue full, rejecting order")
+            response = jsonify({"error": "Too many orders in progress, please retry"})
+            response.headers['Retry-After'] = '1'
+            return response, 429
+        if cart_id is not None:
+            cart_store.discard(cart_id)
+        return jsonify({"success": True, "order_id": order['id'], "status": "queued"}), 202
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error processing order: {e}")
+        logger.error("Error processing order: %s", e)
         return jsonify({"error": "Failed to process order"}), 500
 
+@app.route('/api/order-status/<order_id>')
+def order_status(order_id):
+    status = order_intake.status(order_id)
+    if status is None:
+        return jsonify({"error": "Order not found"}), 404
+    return jsonify({"order_id": order_id, "status": status})
+
+@app.route('/api/menu')
+def menu_api():
+    variants = menu_catalog.variants
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            delta = menu_catalog.delta(int(since))
+        except ValueError:
+            return jsonify({"error": "since must be a menu version number"}), 400
+        # Clients too far behind get the full menu instead
+        if delta is not None:
+            variants = delta
+    return _serve_variants(variants, 'application/json', 'no-cache')
+
+@app.route('/api/menu/item/<item_id>')
+def menu_item(item_id):
+    item = MENU_INDEX.get(item_id)
+    if item is None:
+        return jsonify({"error": "Menu item not found"}), 404
+    return jsonify(item)
+
 @app.route('/api/delete-order/<order_id>', methods=['DELETE'])
 def delete_order(order_id):
     try:
-        global orders
-        original_length = len(orders)
-        orders = [order for order in orders if order['id'] != order_id]
-
-        if len(orders) < original_length:
-            logger.info(f"Order deleted: {order_id}")
+        if remove_order(order_id) is not None:
+            logger.info("Order deleted: %s", order_id)
             return jsonify({"success": True})
         else:
-            logger.error(f"Order not found: {order_id}")
+            logger.error("Order not found: %s", order_id)
             return jsonify({"error": "Order not found"}), 404
+    except OrderLogError:
+        raise
     except Exception as e:
-        logger.error(f"Error deleting order: {e}")
+        logger.error("Error deleting order: %s", e)
         return jsonify({"error": "Failed to delete order"}), 500
 
 # Add the HTML templates as strings to serve them directly
@@ -158,67 +3439,7 @@ TEMPLATES = {
     <title>Kitchen Drone - Food Delivery</title>
     <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0-alpha1/dist/css/bootstrap.min.css" rel="stylesheet">
     <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css">
-    <style>
-        .hero-section {
-            background-size: cover;
-            background-position: center;
-            position: relative;
-        }
-        
-        .hero-section::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 100%;
-            background-color: rgba(0, 0, 0, 0.5);
-        }
-        
-        .hero-section .container {
-            position: relative;
-            z-index: 1;
-        }
-        
-        .cart-icon {
-            position: relative;
-        }
-        
-        .cart-badge {
-            position: absolute;
-            top: -8px;
-            right: -8px;
-            background-color: #dc3545;
-            color: white;
-            border-radius: 50%;
-            width: 20px;
-            height: 20px;
-            font-size: 0.7rem;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-        }
-        
-        .cart-notification {
-            position: fixed;
-            top: 20px;
-            right: 20px;
-            background-color: #28a745;
-            color: white;
-            padding: 10px 15px;
-            border-radius: 5px;
-            z-index: 1000;
-            display: none;
-        }
-        
-        .menu-item {
-            transition: transform 0.3s ease;
-        }
-        
-        .menu-item:hover {
-            transform: translateY(-5px);
-        }
-    </style>
+    <link href="{{ asset_url('app.css') }}" rel="stylesheet">
 </head>
 <body>
     <nav class="navbar navbar-expand-lg navbar-dark bg-dark">
@@ -286,52 +3507,12 @@ TEMPLATES = {
     </footer>
 
     <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0-alpha1/dist/js/bootstrap.bundle.min.js"></script>
-    <script>
-        // Cart functionality
-        let cart = [];
-
-        // Load cart from localStorage
-        function loadCart() {
-            const savedCart = localStorage.getItem('cart');
-            if (savedCart) {
-                cart = JSON.parse(savedCart);
-                updateCartBadge();
-            }
-        }
-
-        // Save cart to localStorage
-        function saveCart() {
-            localStorage.setItem('cart', JSON.stringify(cart));
-            updateCartBadge();
-        }
-
-        // Update cart badge
-        function updateCartBadge() {
-            const cartBadge = document.getElementById('cartBadge');
-            if (cartBadge) {
-                const itemCount = cart.reduce((total, item) => total + item.quantity, 0);
-                cartBadge.textContent = itemCount;
-            }
-        }
-
-        // Show cart notification
-        function showCartNotification() {
-            const notification = document.getElementById('cartNotification');
-            notification.style.display = 'block';
-            setTimeout(() => {
-                notification.style.display = 'none';
-            }, 2000);
-        }
-
-        // Load cart on page load
-        document.addEventListener('DOMContentLoaded', loadCart);
-    </script>
+    <script src="{{ asset_url('app.js') }}"></script>
 </body>
 </html>
     """,
     
-    "index.html": """
-{% extends "layout.html" %}
+    "index.html": """{% extends "layout.html" %}
 
 {% block content %}
 <div class="hero-section" style="background-image: url('https://images.unsplash.com/photo-1473968512647-3e447244af8f');">
@@ -412,8 +3593,7 @@ TEMPLATES = {
 {% endblock %}
     """,
     
-    "menu.html": """
-{% extends "layout.html" %}
+    "menu.html": """{% extends "layout.html" %}
 
 {% block content %}
 <div class="container py-5">
@@ -441,7 +3621,7 @@ TEMPLATES = {
             <p class="mb-4">{{ category.description }}</p>
             
             <div class="row">
-                {% for item in category.items %}
+                {% for item in category['items'] %}
                 <div class="col-md-4 mb-4">
                     <div class="card menu-item h-100">
                         <img src="{{ item.image }}" class="card-img-top" alt="{{ item.name }}">
@@ -488,8 +3668,7 @@ TEMPLATES = {
 {% endblock %}
     """,
     
-    "checkout.html": """
-{% extends "layout.html" %}
+    "checkout.html": """{% extends "layout.html" %}
 
 {% block content %}
 <div class="container py-5">
@@ -523,7 +3702,7 @@ TEMPLATES = {
                             <div class="invalid-feedback" id="pincodeError">
                                 Sorry, delivery is not available in your area.
                             </div>
-                            <small class="text-muted">We currently deliver to: 591143, 591153, 590018, 590006, 590008</small>
+                            <small class="text-muted">Delivery availability is checked as you type your pincode</small>
                         </div>
                         <div class="mb-3">
                             <label for="notes" class="form-label">Delivery Notes (Optional)</label>
@@ -642,6 +3821,28 @@ TEMPLATES = {
         }
     });
     
+    // Check delivery availability as the pincode is typed
+    document.getElementById('pincode').addEventListener('input', async function() {
+        const pincode = this.value.trim();
+        const pincodeError = document.getElementById('pincodeError');
+        if (pincode.length !== 6) {
+            this.classList.remove('is-invalid');
+            pincodeError.style.display = 'none';
+            return;
+        }
+        try {
+            const response = await fetch(`/api/serviceability/${encodeURIComponent(pincode)}`);
+            const data = await response.json();
+            if (data.pincode !== this.value.trim()) {
+                return;
+            }
+            this.classList.toggle('is-invalid', !data.serviceable);
+            pincodeError.style.display = data.serviceable ? 'none' : 'block';
+        } catch (error) {
+            console.error('Error checking pincode:', error);
+        }
+    });
+    
     // Load cart on page load
     document.addEventListener('DOMContentLoaded', function() {
         loadCart();
@@ -651,8 +3852,7 @@ TEMPLATES = {
 {% endblock %}
     """,
     
-    "confirmation.html": """
-{% extends "layout.html" %}
+    "confirmation.html": """{% extends "layout.html" %}
 
 {% block content %}
 <div class="container py-5 text-center">
@@ -677,20 +3877,25 @@ TEMPLATES = {
 {% endblock %}
     """,
     
-    "my-orders.html": """
-{% extends "layout.html" %}
+    "my-orders.html": """{% extends "layout.html" %}
 
 {% block content %}
 <div class="container py-5">
     <h1 class="text-center mb-4">My Orders</h1>
 
+    <div id="new-orders" class="alert alert-info text-center d-none">
+        New orders have been placed. <a href="/my-orders" class="alert-link">Show them</a>
+    </div>
+
     {% if orders %}
         <div class="row">
             {% for order in orders %}
-            <div class="col-md-6 mb-4">
+            <div class="col-md-6 mb-4" id="order-{{ order.id }}">
                 <div class="card">
                     <div class="card-header d-flex justify-content-between align-items-center">
                         <h5 class="mb-0">Order #{{ order.id }}</h5>
+                        {% set status = order_status(order.id) %}
+                        <span class="badge bg-secondary order-status{% if not status %} d-none{% endif %}">{{ status or '' }}</span>
                         <button class="btn btn-sm btn-outline-danger" onclick="deleteOrder('{{ order.id }}')">
                             <i class="fas fa-trash"></i>
                         </button>
@@ -701,7 +3906,7 @@ TEMPLATES = {
                         <div class="mb-3">
                             <h6>Items</h6>
                             <ul class="list-group">
-                                {% for item in order.items %}
+                                {% for item in order['items'] %}
                                 <li class="list-group-item d-flex justify-content-between align-items-center">
                                     {{ item.name }}
                                     <span>
@@ -729,7 +3934,10 @@ TEMPLATES = {
                 </div>
             </div>
             {% endfor %}
-        </div>
+        </div>{% if next_cursor %}
+        <div class="text-center">
+            <a href="/my-orders?cursor={{ next_cursor }}&limit={{ limit }}" class="btn btn-outline-primary">More orders</a>
+        </div>{% endif %}
     {% else %}
         <div class="text-center">
             <p class="lead">No orders found</p>
@@ -739,6 +3947,28 @@ TEMPLATES = {
 </div>
 
 <script>
+    // Status changes are pushed by the server and applied in place
+    const orderEvents = new EventSource('/api/orders/events');
+    orderEvents.addEventListener('status', (event) => {
+        const data = JSON.parse(event.data);
+        const card = document.getElementById(`order-${data.order_id}`);
+        if (data.status === 'placed') {
+            if (!card) {
+                document.getElementById('new-orders').classList.remove('d-none');
+            }
+        } else if (data.status === 'deleted') {
+            if (card) {
+                card.remove();
+            }
+        } else if (card) {
+            const badge = card.querySelector('.order-status');
+            badge.textContent = data.status;
+            badge.classList.remove('d-none');
+        }
+    });
+    // Sent when this page missed events; a fresh render is cheaper to trust
+    orderEvents.addEventListener('resync', () => window.location.reload());
+
     async function deleteOrder(orderId) {
         if (confirm('Are you sure you want to delete this order?')) {
             try {
@@ -749,7 +3979,10 @@ TEMPLATES = {
                 const data = await response.json();
                 if (data.success) {
                     alert('Order deleted successfully');
-                    window.location.reload();
+                    const card = document.getElementById(`order-${orderId}`);
+                    if (card) {
+                        card.remove();
+                    }
                 } else {
                     alert(data.error || 'Failed to delete order');
                 }
@@ -764,47 +3997,391 @@ TEMPLATES = {
     """
 }
 
+# Stylesheet and script shared by every page. They are served as
+# hash-named, long-cached files instead of being inlined into each page.
+ASSETS = {
+    "app.css": """
+.hero-section {
+    background-size: cover;
+    background-position: center;
+    position: relative;
+}
+
+.hero-section::before {
+    content: '';
+    position: absolute;
+    top: 0;
+    left: 0;
+    width: 100%;
+    height: 100%;
+    background-color: rgba(0, 0, 0, 0.5);
+}
+
+.hero-section .container {
+    position: relative;
+    z-index: 1;
+}
+
+.cart-icon {
+    position: relative;
+}
+
+.cart-badge {
+    position: absolute;
+    top: -8px;
+    right: -8px;
+    background-color: #dc3545;
+    color: white;
+    border-radius: 50%;
+    width: 20px;
+    height: 20px;
+    font-size: 0.7rem;
+    display: flex;
+    justify-content: center;
+    align-items: center;
+}
+
+.cart-notification {
+    position: fixed;
+    top: 20px;
+    right: 20px;
+    background-color: #28a745;
+    color: white;
+    padding: 10px 15px;
+    border-radius: 5px;
+    z-index: 1000;
+    display: none;
+}
+
+.menu-item {
+    transition: transform 0.3s ease;
+}
+
+.menu-item:hover {
+    transform: translateY(-5px);
+}
+""",
+
+    "app.js": """
+// Cart functionality
+let cart = [];
+
+// Load cart from localStorage
+function loadCart() {
+    const savedCart = localStorage.getItem('cart');
+    if (savedCart) {
+        cart = JSON.parse(savedCart);
+        updateCartBadge();
+    }
+}
+
+// Save cart to localStorage
+function saveCart() {
+    localStorage.setItem('cart', JSON.stringify(cart));
+    updateCartBadge();
+}
+
+// Update cart badge
+function updateCartBadge() {
+    const cartBadge = document.getElementById('cartBadge');
+    if (cartBadge) {
+        const itemCount = cart.reduce((total, item) => total + item.quantity, 0);
+        cartBadge.textContent = itemCount;
+    }
+}
+
+// Show cart notification
+function showCartNotification() {
+    const notification = document.getElementById('cartNotification');
+    notification.style.display = 'block';
+    setTimeout(() => {
+        notification.style.display = 'none';
+    }, 2000);
+}
+
+// Load cart on page load
+document.addEventListener('DOMContentLoaded', loadCart);
+""",
+}
+
+# Templates, CSS and JS are minified once at startup: HTML loses its
+# indentation and comments, CSS its comments and insignificant whitespace, JS
+# its indentation and comment-only lines (newlines are kept for ASI).
+MINIFY_ASSETS = os.environ.get("MINIFY_ASSETS", "1") != "0"
+_HTML_COMMENT = re.compile(r'<!--.*?-->', re.S)
+_LINE_BREAK = re.compile(r'\s*\n\s*')
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+
+def minify_html(source):
+    return _LINE_BREAK.sub('\n', _HTML_COMMENT.sub('', source)).strip()
+
+def minify_css(source):
+    source = _CSS_PUNCTUATION.sub(r'\1', _CSS_COMMENT.sub('', source))
+    return ' '.join(source.split()).replace(': ', ':').replace(';}', '}')
+
+def minify_js(source):
+    lines = (line.strip() for line in source.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+class MinifyingLoader(DictLoader):
+    # DictLoader's uptodate check compares against the raw TEMPLATES entry,
+    # so edits still trigger a recompile
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(environment, template)
+        return minify_html(source), filename, uptodate
+
+# Shared CSS/JS is served from content-hashed URLs, so it can be cached
+# forever and a deploy that changes it changes the URL
+ASSET_MINIFIERS = {'css': minify_css, 'js': minify_js}
+ASSET_MIMETYPES = {'css': 'text/css', 'js': 'application/javascript'}
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+_assets = {}
+_asset_urls = {}
+
+def build_assets():
+    for name, source in ASSETS.items():
+        stem, ext = name.rsplit('.', 1)
+        if MINIFY_ASSETS:
+            source = ASSET_MINIFIERS[ext](source)
+        body = source.encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        hashed_name = f"{stem}.{digest[:12]}.{ext}"
+        _assets[hashed_name] = (compress_variants(body, digest), ASSET_MIMETYPES[ext])
+        _asset_urls[name] = f"/assets/{hashed_name}"
+
+def asset_url(name):
+    return _asset_urls[name]
+
+build_assets()
+
+# Serve TEMPLATES through a shared Environment so Jinja's own inheritance
+# handles {% extends %}/{% block %}/super(). DictLoader reads the dict live,
+# so auto_reload recompiles a template whenever its TEMPLATES entry changes.
+template_env = Environment(
+    loader=MinifyingLoader(TEMPLATES) if MINIFY_ASSETS else DictLoader(TEMPLATES),
+    bytecode_cache=FileSystemBytecodeCache(os.environ.get("TEMPLATE_BYTECODE_DIR")),
+    auto_reload=True,
+)
+template_env.globals['asset_url'] = asset_url
+
+def get_template(template_name):
+    return template_env.get_template(template_name)
+
+def warm_template_cache():
+    for template_name in TEMPLATES:
+        get_template(template_name)
+
 # Override Flask's render_template to use our template strings
 def render_template(template_name, **context):
-    from jinja2 import Template
-    
-    # Get the template content from our dictionary
-    template_content = TEMPLATES.get(template_name, "Template not found")
-    
-    # If the template extends another template, we need to handle that
-    if "{% extends" in template_content:
-        # Extract the parent template name
-        import re
-        parent_match = re.search(r'{%\s*extends\s*[\'"](.+?)[\'"]', template_content)
-        if parent_match:
-            parent_name = parent_match.group(1)
-            parent_content = TEMPLATES.get(parent_name, "Parent template not found")
-            
-            # Extract the blocks from the child template
-            blocks = {}
-            for block_match in re.finditer(r'{%\s*block\s+(\w+)\s*%}(.*?){%\s*endblock\s*%}', template_content, re.DOTALL):
-                block_name = block_match.group(1)
-                block_content = block_match.group(2)
-                blocks[block_name] = block_content
-            
-            # Replace the block placeholders in the parent template
-            template_content = parent_content
-            for block_name, block_content in blocks.items():
-                template_content = re.sub(
-                    r'{%\s*block\s+' + block_name + r'\s*%}.*?{%\s*endblock\s*%}',
-                    '{% block ' + block_name + ' %}' + block_content + '{% endblock %}',
-                    template_content,
-                    flags=re.DOTALL
-                )
-    
-    # Create a Jinja2 template
-    template = Template(template_content)
-    
-    # Render the template with the provided context
-    rendered = template.render(**context)
-    
-    return rendered
+    # Render the cached, compiled template with the provided context
+    with phase('template_load'):
+        template = get_template(template_name)
+    with phase('template_render'):
+        return template.render(**context)
+
+warm_template_cache()
+
+# Pages that take no per-request context are rendered once and served as
+# precomputed bytes, with one compressed variant per supported encoding.
+STATIC_PAGES = ['index.html', 'checkout.html', 'confirmation.html']
+STATIC_PAGE_CACHE_CONTROL = os.environ.get("STATIC_PAGE_CACHE_CONTROL", "public, max-age=300")
+_static_pages = {}
+
+def prerender_page(template_name):
+    body = render_template(template_name).encode('utf-8')
+    return compress_variants(body, hashlib.sha256(body).hexdigest()[:32])
+
+def prerender_static_pages():
+    for template_name in STATIC_PAGES:
+        _static_pages[template_name] = prerender_page(template_name)
+
+def _negotiate_encoding(encodings):
+    accept = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in encodings and accept[encoding] > 0:
+            return encoding
+    return 'identity'
+
+def _serve_variants(variants, mimetype, cache_control):
+    encoding = _negotiate_encoding(variants)
+    body, etag = variants[encoding]
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': cache_control,
+        'Vary': 'Accept-Encoding',
+    }
+    if request.if_none_match.contains_weak(etag):
+        return app.response_class(status=304, headers=headers)
+
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return app.response_class(body, mimetype=mimetype, headers=headers)
+
+def serve_static_page(template_name):
+    variants = _static_pages.get(template_name)
+    if variants is None:
+        variants = _static_pages[template_name] = prerender_page(template_name)
+    return _serve_variants(variants, 'text/html', STATIC_PAGE_CACHE_CONTROL)
+
+@app.route('/assets/<name>')
+def static_asset(name):
+    asset = _assets.get(name)
+    if asset is None:
+        return jsonify({"error": "Asset not found"}), 404
+    variants, mimetype = asset
+    return _serve_variants(variants, mimetype, ASSET_CACHE_CONTROL)
+
+# Rendered pages and JSON that are not precompressed are compressed on the way
+# out once they are big enough to be worth it. Streamed responses are left
+# alone so their chunks still reach the client as they are produced, and so
+# are _serve_variants responses (marked by Vary), which already picked the
+# best precompressed encoding the client accepts.
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+COMPRESS_MIMETYPES = frozenset(['text/html', 'application/json'])
+DYNAMIC_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or 'Accept-Encoding' in response.vary
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    encoding = _negotiate_encoding(DYNAMIC_ENCODINGS)
+    if encoding == 'identity':
+        return response
+
+    if encoding == 'br':
+        response.set_data(brotli.compress(body, quality=5))
+    else:
+        response.set_data(gzip.compress(body, compresslevel=6, mtime=0))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes differ from the identity ones, so a strong
+    # validator becomes weak; handlers already compare with contains_weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+prerender_static_pages()
+
+# Production serving: a pre-fork gunicorn master with WEB_WORKERS processes of
+# WEB_THREADS threads each (or, with WEB_WORKER_CLASS=gevent, up to
+# WEB_WORKER_CONNECTIONS greenlets each, for many open event streams).
+# Everything expensive is built once in the master by warmup() and shared
+# copy-on-write with the workers. SIGHUP starts fresh workers and retires the
+# old ones gracefully.
+def warmup():
+    build_assets()
+    warm_template_cache()
+    publish_menu()
+    prerender_static_pages()
+    # Move warm objects out of the GC's reach so collections in the workers
+    # don't touch (and un-share) the pages inherited from the master
+    gc.collect()
+    gc.freeze()
+
+def _prepare_for_fork(server, worker):
+    if isinstance(orders, SQLiteOrderStore):
+        orders.close_connection()
+
+# Worker IDs for order IDs: a random base per master plus each worker's
+# spawn counter, so concurrently running workers never share one
+_order_id_worker_base = random.SystemRandom().getrandbits(_ORDER_ID_WORKER_BITS)
+
+def _after_fork(server, worker):
+    configure_logging()
+    if _worker_env is None:
+        generate_order_id.set_worker(_order_id_worker_base + worker.age)
+    # Join (or take over) the shared dispatch schedule, and follow the
+    # other workers' orders, without waiting for the first request that
+    # needs them
+    dispatch_scheduler.start_clock()
+    if order_feed is not None:
+        order_feed.start()
+
+def _worker_exit(server, worker):
+    # Accepted async orders are only in this worker's memory until saved
+    order_intake.drain()
+
+def serve_production():
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        sys.exit("Production serving needs gunicorn: pip install gunicorn")
+
+    if not orders.durable:
+        # Workers fork from the master's copy of the in-memory store, so each
+        # one diverges, and a replacement worker (SIGHUP, MAX_REQUESTS) starts
+        # without the orders its predecessor took
+        sys.exit("Production serving needs a shared order store: set ORDER_STORE=sqlite")
+
+    workers = int(os.environ.get("WEB_WORKERS", os.cpu_count() or 1))
+    threads = int(os.environ.get("WEB_THREADS", 4))
+    worker_class = os.environ.get("WEB_WORKER_CLASS", "gthread")
+    worker_connections = int(os.environ.get("WEB_WORKER_CONNECTIONS", 1000))
+    # Open order event streams per worker, past which /api/orders/events
+    # answers 503. Each cap leaves at least half of a worker's capacity for
+    # ordinary requests, and SSE_MAX_SUBSCRIBERS caps both.
+    #  - gthread (default): every stream pins a thread, so WEB_THREADS // 2
+    #    streams, which is just 2 with the default 4 threads. Fine for a
+    #    handful of staff dashboards, not for customers.
+    #  - gevent: a stream is a greenlet, so WEB_WORKER_CONNECTIONS // 2
+    #    streams (500 by default, thousands across workers). This needs the
+    #    gevent package, which is an optional dependency the app doesn't
+    #    install: pip install gevent.
+    if worker_class == 'gevent':
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            sys.exit("WEB_WORKER_CLASS=gevent needs gevent: pip install gevent")
+        order_events.max_subscribers = min(order_events.max_subscribers, max(1, worker_connections // 2))
+    elif worker_class == 'gthread':
+        order_events.max_subscribers = min(order_events.max_subscribers, max(1, threads // 2))
+    else:
+        sys.exit("WEB_WORKER_CLASS must be gthread or gevent")
+
+    options = {
+        'bind': os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', 5000)}"),
+        'workers': workers,
+        'threads': threads,
+        'worker_class': worker_class,
+        'worker_connections': worker_connections,
+        'keepalive': int(os.environ.get("KEEPALIVE", 5)),
+        'timeout': int(os.environ.get("WORKER_TIMEOUT", 30)),
+        'graceful_timeout': int(os.environ.get("GRACEFUL_TIMEOUT", 30)),
+        'max_requests': int(os.environ.get("MAX_REQUESTS", 0)),
+        'max_requests_jitter': int(os.environ.get("MAX_REQUESTS_JITTER", 0)),
+        'pre_fork': _prepare_for_fork,
+        'post_fork': _after_fork,
+        'worker_exit': _worker_exit,
+    }
+
+    class ProductionServer(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    warmup()
+    if worker_class == 'gevent':
+        logger.info("Starting production server with %s gevent workers x %s connections (%s event streams each)",
+                    workers, worker_connections, order_events.max_subscribers)
+    else:
+        logger.info("Starting production server with %s workers x %s threads (%s event streams each)",
+                    workers, threads, order_events.max_subscribers)
+    ProductionServer().run()
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        serve_production()
+        sys.exit(0)
     logger.info("Starting Flask application")
-    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=True)
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=APP_ENV == 'development')
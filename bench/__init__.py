@@ -0,0 +1,561 @@
+# Benchmarks for all_in_one_app, run from the repository root with:
+#   python -m bench [name ...] [--save FILE] [--baseline FILE] [--threshold FRACTION]
+# Each benchmark returns a dict of metrics; the suffix of a metric's name
+# says which direction is a regression (see find_regressions).
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import all_in_one_app as shop
+from all_in_one_app import (
+    DELIVERY_ZONES, DISPATCH_WINDOW_SECONDS, DRONE_BATTERY_MINUTES, DRONE_PAYLOAD_ITEMS,
+    DRONE_RECHARGE_MINUTES, MENU_INDEX, SSE_BUFFER_SIZE, SSE_HISTORY_SIZE, TEMPLATES, VALID_PINCODES,
+    DispatchScheduler, OrderAnalytics, OrderEvents, OrderLog, OrderStore, app, configure_logging,
+    generate_order_id, logger, orders, phase, remove_order, render_template, shutdown_logging,
+    template_env,
+)
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+def _time_per_call(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+@benchmark('templates')
+def bench_templates(iterations=2000):
+    results = {}
+    for template_name in ['index.html', 'checkout.html', 'confirmation.html', 'my-orders.html']:
+        before = _time_per_call(lambda: template_env.from_string(TEMPLATES[template_name]).render(orders=[]), iterations)
+        after = _time_per_call(lambda: render_template(template_name, orders=[]), iterations)
+        results[template_name] = {'uncached_us': before * 1e6, 'cached_us': after * 1e6}
+    return results
+
+@benchmark('orders')
+def bench_orders(count=100000):
+    sample = [{
+        'id': f"ORD-BENCH-{i:08d}",
+        'timestamp': '2024-01-01 12:00:00',
+        'items': [],
+        'customer_info': {'phone': str(i % 5000), 'pincode': VALID_PINCODES[i % len(VALID_PINCODES)]},
+        'total': 0,
+    } for i in range(count)]
+    victims = [sample[i]['id'] for i in range(0, count, count // 1000)]
+
+    store = OrderStore()
+    start = time.perf_counter()
+    for order in sample:
+        store.add(order)
+    insert = time.perf_counter() - start
+    start = time.perf_counter()
+    for order_id in victims:
+        store.get(order_id)
+    lookup = time.perf_counter() - start
+    start = time.perf_counter()
+    for order_id in victims:
+        store.delete(order_id)
+    delete = time.perf_counter() - start
+
+    # The previous list-based store rebuilt the whole list on every delete
+    order_list = list(sample)
+    start = time.perf_counter()
+    for order_id in victims[:100]:
+        order_list = [order for order in order_list if order['id'] != order_id]
+    list_delete = (time.perf_counter() - start) / 100
+
+    return {
+        'orders': count,
+        'insert_us': insert / count * 1e6,
+        'lookup_us': lookup / len(victims) * 1e6,
+        'delete_us': delete / len(victims) * 1e6,
+        'list_delete_us': list_delete * 1e6,
+    }
+
+def _sample_order(i):
+    return {
+        'id': f"ORD-BENCH-{i:08d}",
+        'timestamp': '2024-01-01 12:00:00',
+        'items': [{'id': 's1', 'name': 'Paneer Tikka', 'price': 249, 'quantity': 1}],
+        'customer_info': {'name': 'Bench', 'address': 'Street', 'phone': str(i % 5000),
+                          'pincode': VALID_PINCODES[i % len(VALID_PINCODES)]},
+        'total': 249,
+    }
+
+@benchmark('my_orders')
+def bench_my_orders(sizes=(1000, 10000, 100000)):
+    client = app.test_client()
+    results = {}
+    saved = list(orders)
+    try:
+        for size in sizes:
+            orders.clear()
+            for i in range(size):
+                orders.add(_sample_order(i))
+            for mode, url in (('page', '/my-orders'), ('stream', '/my-orders?stream=1')):
+                tracemalloc.start()
+                start = time.perf_counter()
+                response = client.get(url, buffered=False)
+                first_chunk = next(iter(response.response))
+                ttfb = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                response.close()
+                results[f"{mode}_{size}"] = {'ttfb_ms': ttfb * 1e3, 'peak_kib': peak / 1024,
+                                             'first_chunk_bytes': len(first_chunk)}
+    finally:
+        orders.clear()
+        for order in saved:
+            orders.add(order)
+    return results
+
+@benchmark('export')
+def bench_export(sizes=(10000, 100000)):
+    # Export throughput and peak memory, which should not grow with the store
+    client = app.test_client()
+    results = {}
+    saved = list(orders)
+    try:
+        for size in sizes:
+            orders.clear()
+            for i in range(size):
+                orders.add(_sample_order(i))
+            tracemalloc.start()
+            start = time.perf_counter()
+            response = client.get('/api/orders/export', buffered=False)
+            exported = sum(chunk.count(b'\n') for chunk in response.response)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            response.close()
+            results[f"orders_{size}"] = {'exported': exported, 'orders_per_s': exported / elapsed,
+                                         'peak_kib': peak / 1024}
+    finally:
+        orders.clear()
+        for order in saved:
+            orders.add(order)
+    return results
+
+@benchmark('batch_orders')
+def bench_batch_orders(orders_per_size=2000, batch_sizes=(1, 10, 100, 500)):
+    # Per-order cost of /api/place-order one at a time versus /api/place-orders
+    client = app.test_client()
+    results = {}
+    placed = []
+    def single():
+        placed.append(client.post('/api/place-order', json=BENCH_ORDER_PAYLOAD).get_json()['order_id'])
+    results['single_us'] = _time_per_call(single, orders_per_size) * 1e6
+    for size in batch_sizes:
+        body = [BENCH_ORDER_PAYLOAD] * size
+        def batch():
+            response = client.post('/api/place-orders', json=body).get_json()
+            placed.extend(result['order_id'] for result in response['results'])
+        results[f"batch_{size}_per_order_us"] = _time_per_call(batch, max(1, orders_per_size // size)) * 1e6 / size
+    for order_id in placed:
+        remove_order(order_id)
+    return results
+
+@benchmark('analytics')
+def bench_analytics(count=1000000, queries=5):
+    # Projection build and per-order update cost, then each query over count
+    # orders with NumPy (when installed) and with the plain-Python fallback.
+    # snapshot_ms is how long a query holds the lock that order intake needs.
+    item_ids = list(MENU_INDEX)
+    start_time = datetime(2024, 1, 1)
+    timestamps = [(start_time + timedelta(minutes=m)).strftime(OrderAnalytics.TIMESTAMP_FORMAT)
+                  for m in range(0, 30 * 24 * 60, 10)]
+    sample = []
+    for i in range(count):
+        order = _sample_order(i)
+        order['timestamp'] = timestamps[i % len(timestamps)]
+        order['items'] = [{'id': item_ids[(i + j) % len(item_ids)], 'price': 100 + j, 'quantity': 1 + j}
+                          for j in range(i % 3 + 1)]
+        sample.append(order)
+
+    analytics = OrderAnalytics()
+    start = time.perf_counter()
+    analytics.add_many(sample)
+    results = {'orders': count, 'add_us': (time.perf_counter() - start) / count * 1e6,
+               'snapshot_ms': _time_per_call(lambda: analytics._snapshot('time', 'total', lines=True),
+                                             queries) * 1e3}
+    calls = {
+        'revenue_by_hour': analytics.revenue_by_hour,
+        'top_items': analytics.top_items,
+        'cart_size': analytics.cart_size,
+        'by_pincode': analytics.by_pincode,
+    }
+    installed = shop.numpy
+    try:
+        for mode in ('numpy', 'python'):
+            if mode == 'python':
+                shop.numpy = None
+            elif installed is None:
+                continue
+            results[mode] = {f"{name}_ms": _time_per_call(call, queries) * 1e3 for name, call in calls.items()}
+    finally:
+        shop.numpy = installed
+    return results
+
+@benchmark('order_log')
+def bench_order_log(appends=5000, threads=16, recovery_size=1000000):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        store = OrderStore()
+        log = OrderLog(directory, store)
+        log.start()
+        sample = [_sample_order(i) for i in range(appends)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(log.append_put, sample))
+        elapsed = time.perf_counter() - start
+        log.close()
+        results['group_commit'] = {'appends': appends, 'threads': threads,
+                                   'appends_per_s': appends / elapsed}
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = OrderStore()
+        for i in range(recovery_size):
+            store.add(_sample_order(i))
+        log = OrderLog(directory, store)
+        log.start()
+        log.compact()
+        for i in range(0, 1000):
+            log.append_delete(f"ORD-BENCH-{i:08d}")
+        log.close()
+        del store
+
+        recovered = OrderStore()
+        start = time.perf_counter()
+        loaded, replayed = OrderLog(directory, recovered).replay()
+        results['recovery'] = {'snapshot_orders': loaded, 'log_records': replayed,
+                               'orders': len(recovered), 'seconds': time.perf_counter() - start}
+    return results
+
+@benchmark('logging')
+def bench_logging(requests=2000):
+    # /api/place-order latency with DEBUG logging written synchronously on the
+    # request thread versus through the batching queue writer
+    client = app.test_client()
+    payload = {
+        'items': [{'id': 's1', 'quantity': 1}],
+        'customerInfo': {'name': 'Bench', 'address': 'Street', 'phone': '1', 'pincode': VALID_PINCODES[0]},
+    }
+    level = logging.getLogger().level
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for mode, use_queue in (('sync', False), ('queue', True)):
+                with open(os.path.join(directory, f"{mode}.log"), 'w') as stream:
+                    configure_logging(level='DEBUG', fmt='json', use_queue=use_queue, stream=stream)
+                    placed = []
+                    def place():
+                        placed.append(client.post('/api/place-order', json=payload).get_json()['order_id'])
+                    results[mode] = {
+                        'place_order_us': _time_per_call(place, requests) * 1e6,
+                        # Cost of one log call as seen by the request thread
+                        'log_call_us': _time_per_call(
+                            lambda: logger.info("New order created: %s", 'ORD-BENCH'), requests * 10) * 1e6,
+                    }
+                    shutdown_logging()
+                for order_id in placed:
+                    orders.delete(order_id)
+    finally:
+        configure_logging(level=level)
+    return results
+
+def _legacy_order_id():
+    # The previous generator: minute timestamp plus 32 random bits
+    return f"ORD-{datetime.now().strftime('%Y%m%d%H%M')}-{str(uuid.uuid4())[:8]}"
+
+@benchmark('order_ids')
+def bench_order_ids(iterations=200000):
+    # Uniqueness and monotonicity are checked in tests/test_order_ids.py
+    return {
+        'legacy_us': _time_per_call(_legacy_order_id, iterations) * 1e6,
+        'generator_us': _time_per_call(generate_order_id, iterations) * 1e6,
+        'many_us': _time_per_call(lambda: generate_order_id.many(100), iterations // 100) * 1e6 / 100,
+    }
+
+@benchmark('dispatch')
+def bench_dispatch(pending=10000, drones_per_base=50):
+    # Re-planning cost per arrival and deletion with thousands of pending
+    # orders, on a simulated clock that advances one second per order
+    clock = [time.time()]
+    scheduler = DispatchScheduler(DELIVERY_ZONES, drones_per_base, DRONE_PAYLOAD_ITEMS,
+                                  DRONE_BATTERY_MINUTES, DRONE_RECHARGE_MINUTES,
+                                  DISPATCH_WINDOW_SECONDS, clock=lambda: clock[0])
+    sample = [_sample_order(i) for i in range(pending)]
+    zones = [DELIVERY_ZONES[order['customer_info']['pincode']] for order in sample]
+
+    start = time.perf_counter()
+    for order, zone in zip(sample, zones):
+        clock[0] += 1
+        scheduler.add_order(order, zone)
+    add = (time.perf_counter() - start) / pending
+    start = time.perf_counter()
+    for order in sample[::2]:
+        scheduler.remove_order(order['id'])
+    remove = (time.perf_counter() - start) / len(sample[::2])
+    start = time.perf_counter()
+    batches = scheduler.assignments()
+    listing = time.perf_counter() - start
+    return {'pending_orders': pending, 'add_us': add * 1e6, 'remove_us': remove * 1e6,
+            'list_ms': listing * 1e3, 'batches': len(batches)}
+
+@benchmark('order_events')
+def bench_order_events(subscribers=5000, events=200):
+    # Fan-out cost with thousands of idle subscribers, and the memory each
+    # idle subscriber holds
+    hub = OrderEvents(SSE_BUFFER_SIZE, SSE_HISTORY_SIZE, subscribers)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subs = [hub.subscribe() for _ in range(subscribers)]
+    per_subscriber = (tracemalloc.get_traced_memory()[0] - before) / subscribers
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for i in range(events):
+        hub.publish(f"ORD-{i}", 'dispatched', zone='bench', drone_id='D1')
+    publish = (time.perf_counter() - start) / events
+    start = time.perf_counter()
+    delivered = sum(len(sub.drain()) for sub in subs)
+    drain = time.perf_counter() - start
+    return {'subscribers': subscribers, 'publish_us': publish * 1e6,
+            'per_delivery_ns': publish / subscribers * 1e9, 'drain_all_ms': drain * 1e3,
+            'delivered': delivered, 'bytes_per_idle_subscriber': per_subscriber}
+
+@benchmark('metrics')
+def bench_metrics(requests=5000):
+    # Per-request cost of the instrumentation hooks and phase timers, on a
+    # cheap route and on the place-order path
+    client = app.test_client()
+    enabled = shop.METRICS_ENABLED
+    results = {}
+    try:
+        for mode in ('off', 'on'):
+            shop.METRICS_ENABLED = mode == 'on'
+            placed = []
+            def place():
+                placed.append(client.post('/api/place-order', json=BENCH_ORDER_PAYLOAD).get_json()['order_id'])
+            results[mode] = {
+                'menu_item_us': _time_per_call(lambda: client.get('/api/menu/item/s1'), requests) * 1e6,
+                'place_order_us': _time_per_call(place, requests // 5) * 1e6,
+            }
+            for order_id in placed:
+                remove_order(order_id)
+    finally:
+        shop.METRICS_ENABLED = enabled
+    def timed_phase():
+        with phase('bench'):
+            pass
+    results['phase_timer_ns'] = _time_per_call(timed_phase, requests) * 1e9
+    return results
+
+# Route benchmarks: every page and order endpoint driven through the test
+# client at each order-store size and concurrency level, reporting latency
+# percentiles, throughput and RSS. Override the sweep with e.g.
+# BENCH_STORE_SIZES=1000,10000 BENCH_CONCURRENCY=1,16.
+BENCH_STORE_SIZES = tuple(int(n) for n in os.environ.get(
+    "BENCH_STORE_SIZES", "1000,10000,100000,1000000").split(','))
+BENCH_CONCURRENCY = tuple(int(n) for n in os.environ.get("BENCH_CONCURRENCY", "1,8,32").split(','))
+BENCH_ROUTE_REQUESTS = int(os.environ.get("BENCH_ROUTE_REQUESTS", 400))
+# Fail a compared run when a metric is this much worse than the baseline
+BENCH_REGRESSION_THRESHOLD = float(os.environ.get("BENCH_REGRESSION_THRESHOLD", 0.25))
+
+BENCH_ORDER_PAYLOAD = {
+    'items': [{'id': 's1', 'quantity': 1}],
+    'customerInfo': {'name': 'Bench', 'address': 'Street', 'phone': '1', 'pincode': VALID_PINCODES[0]},
+}
+
+def _latency_summary(samples, elapsed=None):
+    samples = sorted(samples)
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p))] * 1e3
+    summary = {'requests': len(samples), 'p50_ms': percentile(0.50), 'p95_ms': percentile(0.95),
+               'p99_ms': percentile(0.99)}
+    if elapsed is not None:
+        summary['requests_per_s'] = len(samples) / elapsed
+    return summary
+
+def _rss_kib():
+    # Current resident set size where /proc exists, else the peak
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _route_calls(placed):
+    # Route name -> function issuing one request with a client; deletes
+    # remove orders placed by the place-order run before them
+    def place(client):
+        response = client.post('/api/place-order', json=BENCH_ORDER_PAYLOAD)
+        placed.append(response.get_json()['order_id'])
+        return response
+    return {
+        'index': lambda client: client.get('/'),
+        'menu': lambda client: client.get('/menu'),
+        'my_orders': lambda client: client.get('/my-orders'),
+        'place_order': place,
+        'delete_order': lambda client: client.delete(f"/api/delete-order/{placed.pop()}"),
+    }
+
+def _drive_route(call, requests, concurrency):
+    samples = []
+    errors = []
+
+    def one(_):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = call(client)
+        samples.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    result = _latency_summary(samples, time.perf_counter() - start)
+    if errors:
+        raise AssertionError(f"{len(errors)} failed requests, e.g. status {errors[0]}")
+    return result
+
+@benchmark('routes')
+def bench_routes(sizes=BENCH_STORE_SIZES, concurrency_levels=BENCH_CONCURRENCY,
+                 requests=BENCH_ROUTE_REQUESTS):
+    results = {}
+    saved = list(orders)
+    try:
+        orders.clear()
+        filled = 0
+        for size in sorted(sizes):
+            # Grow the store to the next size instead of refilling it
+            for i in range(filled, size):
+                orders.add(_sample_order(i))
+            filled = size
+            by_concurrency = {}
+            for concurrency in concurrency_levels:
+                placed = []
+                by_concurrency[f"c{concurrency}"] = {
+                    name: _drive_route(call, requests, concurrency)
+                    for name, call in _route_calls(placed).items()
+                }
+            results[f"orders_{size}"] = {'rss_kib': _rss_kib(), 'concurrency': by_concurrency}
+    finally:
+        orders.clear()
+        for order in saved:
+            orders.add(order)
+    return results
+
+def _http_load_worker(args):
+    # One load-generating process: a keep-alive connection (reopened when
+    # the server closes it) issuing each route in turn
+    from http.client import HTTPConnection
+    from urllib.parse import urlsplit
+    base_url, requests = args
+    target = urlsplit(base_url)
+    connection = HTTPConnection(target.hostname, target.port or 80, timeout=30)
+    body = json.dumps(BENCH_ORDER_PAYLOAD)
+    samples = {'index': [], 'menu': [], 'my_orders': [], 'place_order': [], 'delete_order': []}
+    errors = 0
+
+    def call(name, method, path, payload=None):
+        nonlocal errors
+        headers = {'Content-Type': 'application/json'} if payload else {}
+        start = time.perf_counter()
+        connection.request(method, path, body=payload, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        samples[name].append(time.perf_counter() - start)
+        if response.status != 200:
+            errors += 1
+        return data
+
+    for _ in range(requests):
+        call('index', 'GET', '/')
+        call('menu', 'GET', '/menu')
+        call('my_orders', 'GET', '/my-orders')
+        order_id = json.loads(call('place_order', 'POST', '/api/place-order', body))['order_id']
+        call('delete_order', 'DELETE', f"/api/delete-order/{order_id}")
+    connection.close()
+    return samples, errors
+
+@benchmark('http')
+def bench_http(processes=4, requests=200):
+    # Real HTTP load from separate processes, against BENCH_HTTP_URL (e.g. a
+    # gunicorn started with "serve") or else a threaded server in this process
+    base_url = os.environ.get("BENCH_HTTP_URL")
+    server = None
+    access_log = logging.getLogger('werkzeug')
+    access_log_level = access_log.level
+    if base_url is None:
+        access_log.setLevel(logging.WARNING)
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, name='bench-http', daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        start = time.perf_counter()
+        with multiprocessing.get_context('fork').Pool(processes) as pool:
+            outcomes = pool.map(_http_load_worker, [(base_url, requests)] * processes)
+        elapsed = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.shutdown()
+            access_log.setLevel(access_log_level)
+
+    errors = sum(worker_errors for _, worker_errors in outcomes)
+    if errors:
+        raise AssertionError(f"{errors} failed HTTP requests")
+    results = {'processes': processes, 'total_requests_per_s':
+               sum(len(samples) for worker_samples, _ in outcomes
+                   for samples in worker_samples.values()) / elapsed}
+    for name in outcomes[0][0]:
+        samples = [sample for worker_samples, _ in outcomes for sample in worker_samples[name]]
+        # Routes are interleaved, so only the total rate is meaningful
+        results[name] = _latency_summary(samples)
+    if server is not None:
+        results['server_rss_kib'] = _rss_kib()
+    return results
+
+def run_benchmarks(names):
+    results = {}
+    for name in names or list(BENCHMARKS):
+        results[name] = BENCHMARKS[name]()
+        print(json.dumps({name: results[name]}, indent=2))
+    return results
+
+# Metric names say which direction is worse: times and sizes regress when
+# they grow, rates when they shrink. Counts and other values are ignored.
+_LOWER_IS_BETTER = ('_ms', '_us', '_ns', '_kib', 'seconds')
+_HIGHER_IS_BETTER = ('_per_s',)
+
+def find_regressions(baseline, results, threshold, path=''):
+    regressions = []
+    for key, value in results.items():
+        previous = baseline.get(key) if isinstance(baseline, dict) else None
+        name = f"{path}.{key}" if path else key
+        if isinstance(value, dict):
+            regressions += find_regressions(previous or {}, value, threshold, name)
+        elif isinstance(value, (int, float)) and isinstance(previous, (int, float)) and previous > 0:
+            if key.endswith(_LOWER_IS_BETTER) and value > previous * (1 + threshold):
+                regressions.append((name, previous, value))
+            elif key.endswith(_HIGHER_IS_BETTER) and value < previous * (1 - threshold):
+                regressions.append((name, previous, value))
+    return regressions
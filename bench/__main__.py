@@ -0,0 +1,36 @@
+import argparse
+import json
+import logging
+import sys
+
+from bench import BENCH_REGRESSION_THRESHOLD, BENCHMARKS, find_regressions, run_benchmarks
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m bench')
+    parser.add_argument('names', nargs='*', metavar='name', help=', '.join(BENCHMARKS))
+    parser.add_argument('--save', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=BENCH_REGRESSION_THRESHOLD,
+                        help="fractional change that counts as a regression")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    results = run_benchmarks(args.names)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(baseline, results, args.threshold)
+        for name, previous, value in regressions:
+            print(f"REGRESSION {name}: {previous:.4g} -> {value:.4g}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.WARNING)
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep request logging (including rejected orders) out of the test output
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+import all_in_one_app as shop  # noqa: E402
+
+
+def make_scheduler(clock=None, **overrides):
+    options = dict(zones=shop.DELIVERY_ZONES, drones_per_base=2, payload_items=10, battery_minutes=90,
+                   recharge_minutes=15, window_seconds=120)
+    options.update(overrides)
+    if clock is not None:
+        options['clock'] = clock
+    return shop.DispatchScheduler(**options)
+
+
+@pytest.fixture
+def app_state(monkeypatch):
+    # A fresh in-memory store, projection, schedule and event hub per test,
+    # so tests neither see nor leave behind each other's orders
+    events = shop.OrderEvents(shop.SSE_BUFFER_SIZE, shop.SSE_HISTORY_SIZE, shop.SSE_MAX_SUBSCRIBERS)
+    monkeypatch.setattr(shop, 'orders', shop.OrderStore())
+    monkeypatch.setattr(shop, 'order_log', None)
+    monkeypatch.setattr(shop, 'order_analytics', shop.OrderAnalytics())
+    monkeypatch.setattr(shop, 'order_events', events)
+    monkeypatch.setattr(shop, 'dispatch_scheduler', make_scheduler(on_status=events.publish))
+    return shop
+
+
+@pytest.fixture
+def client(app_state):
+    return shop.app.test_client()
+
+
+def order_payload(pincode=None, quantity=1, **customer):
+    info = {'name': 'Test', 'phone': '9876543210', 'address': '12 Main Street',
+            'pincode': pincode or shop.VALID_PINCODES[0]}
+    info.update(customer)
+    return {'items': [{'id': 's1', 'quantity': quantity}], 'customerInfo': info}
@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+import all_in_one_app as shop
+from conftest import order_payload
+from test_order_store import make_order
+
+
+def timed_order(order_id, hour, pincode='590006', quantity=1, item='s1', price=249):
+    order = make_order(order_id, pincode=pincode, quantity=quantity)
+    order['timestamp'] = f'2026-01-01 {hour:02d}:30:00'
+    order['items'][0].update(id=item, price=price)
+    order['total'] = price * quantity
+    return order
+
+
+@pytest.fixture(params=['numpy', 'loops'])
+def analytics(request, monkeypatch):
+    if request.param == 'loops':
+        monkeypatch.setattr(shop, 'numpy', None)
+    elif shop.numpy is None:
+        pytest.skip("NumPy is not installed")
+    return shop.OrderAnalytics()
+
+
+def test_aggregates_follow_adds_and_removes(analytics):
+    analytics.add_many([
+        timed_order('ORD-1', 12, quantity=2),
+        timed_order('ORD-2', 12, pincode='590018', item='m1', price=100),
+        timed_order('ORD-3', 13, quantity=3),
+    ])
+    analytics.remove('ORD-2')
+    hours = analytics.revenue_by_hour()
+    assert [(revenue, count) for _, revenue, count in hours] == [(498.0, 1), (747.0, 1)]
+    assert analytics.top_items() == [('s1', 5, 1245.0)]
+    assert analytics.cart_size() == (2, 2.5, 622.5)
+    assert analytics.by_pincode() == [('590006', 2, 1245.0)]
+    # Re-adding an order replaces it
+    analytics.add(timed_order('ORD-1', 12, quantity=1))
+    assert analytics.cart_size()[:2] == (2, 2.0)
+
+
+def test_time_range_selects_rows(analytics):
+    analytics.add_many([timed_order(f'ORD-{hour}', hour) for hour in range(10, 14)])
+    since = shop.datetime(2026, 1, 1, 11).timestamp()
+    until = shop.datetime(2026, 1, 1, 13).timestamp()
+    assert analytics.cart_size(since, until)[0] == 2
+
+
+def test_compaction_keeps_answers_and_drops_dead_rows(analytics):
+    analytics.add_many([timed_order(f'ORD-{i:05d}', i % 24, quantity=1 + i % 3) for i in range(4000)])
+    for i in range(4000):
+        if i % 4:
+            analytics.remove(f'ORD-{i:05d}')
+    # Rows added and removed while the compaction may be running
+    for i in range(4000, 4100):
+        analytics.add(timed_order(f'ORD-{i:05d}', i % 24))
+    for i in range(0, 400, 4):
+        analytics.remove(f'ORD-{i:05d}')
+    deadline = time.monotonic() + 10
+    while analytics._compacting and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    expected = shop.OrderAnalytics()
+    expected.add_many(timed_order(f'ORD-{i:05d}', i % 24, quantity=1 + i % 3) for i in range(4000)
+                      if i % 4 == 0 and i >= 400)
+    expected.add_many(timed_order(f'ORD-{i:05d}', i % 24) for i in range(4000, 4100))
+    assert len(analytics) == len(expected) == 1000
+    # The dead rows were compacted away
+    assert len(analytics._live) < 2000
+    assert analytics.cart_size() == expected.cart_size()
+    assert analytics.revenue_by_hour() == expected.revenue_by_hour()
+    assert analytics.top_items() == expected.top_items()
+
+
+def test_endpoints_report_placed_orders(client):
+    for quantity in (1, 3):
+        client.post('/api/place-order', json=order_payload(quantity=quantity))
+    cart = client.get('/api/analytics/cart-size').get_json()
+    assert (cart['orders'], cart['average_items']) == (2, 2.0)
+    assert client.get('/api/analytics/top-items').get_json()['items'][0]['quantity'] == 4
+    assert client.get('/api/analytics/revenue?since=nonsense').status_code == 400
+
+
+def test_workers_on_sqlite_see_each_others_orders(tmp_path):
+    path = str(tmp_path / 'orders.db')
+    ours, theirs = shop.SQLiteOrderStore(path), shop.SQLiteOrderStore(path)
+    analytics = shop.OrderAnalytics()
+    feed = shop.OrderFeed(ours, interval=3600)
+    feed.subscribe(analytics.add_many, lambda order_ids: [analytics.remove(order_id) for order_id in order_ids])
+
+    # Our own order, already in the projection, isn't handed back
+    feed.note_local(added=['ORD-1'])
+    ours.add(timed_order('ORD-1', 12))
+    analytics.add(timed_order('ORD-1', 12))
+    theirs.add_many([timed_order('ORD-2', 12), timed_order('ORD-3', 13)])
+    feed.poll()
+    assert len(analytics) == 3
+    assert analytics._dead == 0
+
+    theirs.delete('ORD-2')
+    feed.poll()
+    assert len(analytics) == 2
+    assert analytics.cart_size()[0] == 2
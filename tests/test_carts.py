@@ -0,0 +1,78 @@
+import pytest
+
+import all_in_one_app as shop
+from conftest import order_payload
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def carts(monkeypatch):
+    store = shop.CartStore(ttl_seconds=60, max_carts=3, clock=FakeClock())
+    monkeypatch.setattr(shop, 'cart_store', store)
+    return store
+
+
+def test_cart_lines_merge_and_respect_limits():
+    cart = shop.Cart(0)
+    cart.add('s1', 2)
+    cart.add('s1', 3)
+    cart.add('s2', 1)
+    assert cart.order_items() == [{'id': 's1', 'quantity': 5}, {'id': 's2', 'quantity': 1}]
+    with pytest.raises(ValueError):
+        cart.add('s1', shop.MAX_ITEM_QUANTITY)
+    cart.remove('s1', 2)
+    cart.remove('s2')
+    assert cart.order_items() == [{'id': 's1', 'quantity': 3}]
+    line = cart.to_dict('c')['items'][0]
+    assert line['line_total'] == 3 * shop.MENU_PRICES['s1']
+
+
+def test_idle_carts_expire(carts):
+    cart_id, cart = carts.get(None, create=True)
+    carts.clock.now += 59
+    assert carts.get(cart_id) == (cart_id, cart)
+    # Reading the cart renewed it
+    carts.clock.now += 59
+    assert carts.get(cart_id)[1] is cart
+    carts.clock.now += 60
+    assert carts.get(cart_id) == (None, None)
+    assert len(carts) == 0
+
+
+def test_least_recently_used_cart_is_evicted_at_capacity(carts):
+    ids = [carts.get(None, create=True)[0] for _ in range(3)]
+    carts.get(ids[0])
+    carts.get(None, create=True)
+    assert carts.get(ids[1]) == (None, None)
+    assert carts.get(ids[0])[0] == ids[0]
+    assert len(carts) == 3
+
+
+def test_session_cart_is_ordered_and_then_discarded(client, app_state, carts):
+    assert client.post('/api/cart/add', json={'id': 's1', 'quantity': 2}).status_code == 200
+    cart = client.post('/api/cart/add', json={'id': 's2'}).get_json()
+    assert [line['quantity'] for line in cart['items']] == [2, 1]
+    assert client.post('/api/cart/add', json={'id': 'no-such-dish'}).status_code == 400
+
+    payload = order_payload()
+    del payload['items']
+    response = client.post('/api/place-order', json=payload)
+    assert response.status_code == 200
+    order = app_state.orders.get(response.get_json()['order_id'])
+    assert [(item['id'], item['quantity']) for item in order['items']] == [('s1', 2), ('s2', 1)]
+    assert client.get('/api/cart').get_json()['items'] == []
+    assert len(carts) == 0
+
+
+def test_session_cookie_holds_only_the_cart_id(client, carts):
+    for item_id in ('s1', 's2', 's3'):
+        client.post('/api/cart/add', json={'id': item_id, 'quantity': 5})
+    with client.session_transaction() as session:
+        assert list(session.keys()) == ['cart_id']
@@ -0,0 +1,208 @@
+from datetime import datetime
+
+import pytest
+
+import all_in_one_app as shop
+from conftest import make_scheduler, order_payload
+from test_order_store import make_order
+
+CENTRAL = shop.DELIVERY_ZONES['590006']
+NORTH = shop.DELIVERY_ZONES['590018']
+START = datetime(2026, 1, 1, 12, 0, 0).timestamp()
+
+
+class FakeClock:
+    def __init__(self, now=START):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def placed_order(order_id, quantity, at, pincode='590006'):
+    order = make_order(order_id, pincode=pincode, quantity=quantity)
+    order['timestamp'] = datetime.fromtimestamp(at).strftime("%Y-%m-%d %H:%M:%S")
+    return order
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def events():
+    return []
+
+
+@pytest.fixture
+def scheduler(clock, events):
+    return make_scheduler(clock, on_status=lambda order_id, status, **details: events.append((order_id, status)))
+
+
+def by_id(batches):
+    return {batch['batch_id']: batch for batch in batches}
+
+
+def test_batch_closes_when_the_next_order_would_overflow_the_drone(scheduler):
+    first = scheduler.add_order(make_order('ORD-1', quantity=4), CENTRAL)
+    assert scheduler.add_order(make_order('ORD-2', quantity=4), CENTRAL) == first
+    second = scheduler.add_order(make_order('ORD-3', quantity=4), CENTRAL)
+    assert second != first
+    batches = by_id(scheduler.assignments(include_dispatched=True))
+    # A drone was free, so the closed batch left straight away
+    assert batches[first]['status'] == 'dispatched'
+    assert batches[first]['orders'] == ['ORD-1', 'ORD-2']
+    assert batches[second]['status'] == 'open'
+
+
+def test_batch_closes_when_its_window_ends(scheduler, clock):
+    batch_id = scheduler.add_order(make_order('ORD-1'), CENTRAL)
+    clock.now += 119
+    assert by_id(scheduler.assignments())[batch_id]['status'] == 'open'
+    clock.now += 2
+    assert scheduler.assignments() == []
+    batch = by_id(scheduler.assignments(include_dispatched=True))[batch_id]
+    assert batch['status'] == 'dispatched'
+    assert batch['drone_id'].startswith(CENTRAL.drone_base)
+
+
+def test_zones_batch_separately(scheduler):
+    assert scheduler.add_order(make_order('ORD-1'), CENTRAL) != scheduler.add_order(make_order('ORD-2'), NORTH)
+
+
+def test_a_drone_is_never_double_booked(scheduler, clock):
+    for i in range(40):
+        clock.now += 10
+        scheduler.add_order(make_order(f"ORD-{i}", quantity=10), CENTRAL if i % 2 else NORTH)
+    trips = {}
+    for batch in scheduler.assignments(include_dispatched=True):
+        depart = datetime.fromisoformat(batch['depart_at']).timestamp()
+        back = datetime.fromisoformat(batch['return_at']).timestamp()
+        trips.setdefault(batch['drone_id'], []).append((depart, back))
+    assert len(trips) == 2
+    for drone_trips in trips.values():
+        drone_trips.sort()
+        for (_, back), (depart, _) in zip(drone_trips, drone_trips[1:]):
+            assert depart >= back + scheduler.recharge_seconds
+
+
+def test_removing_the_last_order_cancels_the_batch(scheduler):
+    batch_id = scheduler.add_order(make_order('ORD-1'), CENTRAL)
+    scheduler.remove_order('ORD-1')
+    assert scheduler.assignments() == []
+    assert scheduler.batch_for_order('ORD-1') is None
+    # The zone gets a fresh batch
+    assert scheduler.add_order(make_order('ORD-2'), CENTRAL) != batch_id
+
+
+def test_cancelled_trip_hands_the_drone_back(scheduler):
+    # Both drones leave at once; the third full batch waits for one of them
+    for i in range(3):
+        scheduler.add_order(make_order(f"ORD-{i}", quantity=10), CENTRAL)
+    waiting = scheduler.batch_for_order('ORD-2')
+    assert waiting['status'] == 'assigned'
+    scheduler.remove_order('ORD-2')
+    assert scheduler.batch_for_order('ORD-2') is None
+    scheduler.add_order(make_order('ORD-3', quantity=10), CENTRAL)
+    replacement = scheduler.batch_for_order('ORD-3')
+    assert (replacement['drone_id'], replacement['depart_at']) == (waiting['drone_id'], waiting['depart_at'])
+
+
+def test_adding_an_order_twice_is_a_no_op(scheduler):
+    batch_id = scheduler.add_order(make_order('ORD-1', quantity=3), CENTRAL)
+    assert scheduler.add_order(make_order('ORD-1', quantity=3), CENTRAL) == batch_id
+    assert scheduler.batch_for_order('ORD-1')['payload'] == 3
+
+
+def test_trips_announce_departure_and_return(scheduler, clock, events):
+    scheduler.add_order(make_order('ORD-1'), CENTRAL)
+    assert scheduler.order_status('ORD-1') == 'placed'
+    clock.now += scheduler.window_seconds
+    assert scheduler.order_status('ORD-1') == 'dispatched'
+    # Deleting a dispatched order doesn't recall the drone
+    scheduler.remove_order('ORD-1')
+    assert scheduler.assignments(include_dispatched=True)[0]['orders'] == ['ORD-1']
+    clock.now += CENTRAL.eta_minutes * 120
+    assert scheduler.assignments(include_dispatched=True) == []
+    assert events == [('ORD-1', 'dispatched'), ('ORD-1', 'delivered')]
+
+
+def test_rebuild_reproduces_the_live_schedule(scheduler, clock, events):
+    placed = []
+    for i in range(30):
+        at = START + i * 45
+        order = placed_order(f"ORD-{i:02d}", quantity=1 + i % 4, at=at, pincode='590006' if i % 3 else '590018')
+        placed.append(order)
+        clock.now = at
+        scheduler.add_order(order, shop.DELIVERY_ZONES[order['customer_info']['pincode']])
+    clock.now += 60
+    live = scheduler.assignments(include_dispatched=True)
+    announced = len(events)
+
+    rebuilt = make_scheduler(clock, on_status=lambda *args, **details: events.append(args))
+    rebuilt.rebuild(placed, shop.DELIVERY_ZONES)
+    assert rebuilt.assignments(include_dispatched=True) == live
+    assert len(events) == announced
+
+
+def test_workers_share_one_schedule_through_sqlite(tmp_path, clock):
+    path = str(tmp_path / 'orders.db')
+    lock_path = path + '.dispatch-lock'
+    announced = []
+    leader = shop.SharedDispatch(make_scheduler(clock), shop.SQLiteOrderStore(path), shop.DELIVERY_ZONES,
+                                 lock_path, sync_seconds=3600)
+    follower_store = shop.SQLiteOrderStore(path)
+    follower = shop.SharedDispatch(make_scheduler(clock), follower_store, shop.DELIVERY_ZONES, lock_path,
+                                   sync_seconds=3600, on_status=lambda order_id, status, **details:
+                                   announced.append((order_id, status)))
+    leader.start_clock()
+    follower.start_clock()
+    assert leader._leader and not follower._leader
+
+    # An order saved by the follower's process reaches the leader's schedule
+    follower_store.add(placed_order('ORD-1', quantity=2, at=clock.now))
+    follower_store.add(placed_order('ORD-2', quantity=2, at=clock.now))
+    assert follower.add_order(follower_store.get('ORD-1'), CENTRAL) is None
+    leader._sync_orders()
+    leader._publish()
+    follower._load_state()
+    assert follower.batch_for_order('ORD-1') == leader.batch_for_order('ORD-1')
+    assert follower.order_status('ORD-2') == 'placed'
+
+    # Deletes are picked up from the store too
+    follower_store.delete('ORD-2')
+    leader._sync_orders()
+    leader._publish()
+    follower._load_state()
+    assert follower.batch_for_order('ORD-2') is None
+    assert follower.assignments() == leader.assignments()
+
+    # Departures and returns are announced by the follower as well
+    clock.now += 200
+    leader._publish()
+    follower._load_state()
+    assert follower.order_status('ORD-1') == 'dispatched'
+    clock.now += CENTRAL.eta_minutes * 120
+    leader._publish()
+    follower._load_state()
+    assert announced == [('ORD-1', 'dispatched'), ('ORD-1', 'delivered')]
+
+
+def test_an_order_no_drone_can_carry_is_dropped(scheduler, events):
+    # Placement rejects these; a replayed older order can still turn up
+    assert scheduler.add_order(make_order('ORD-1', quantity=12), CENTRAL) is None
+    assert scheduler.assignments(include_dispatched=True) == []
+    assert scheduler.order_status('ORD-1') is None
+    assert scheduler._batches == {} and scheduler._order_batch == {}
+    # The zone batches normally afterwards
+    assert scheduler.add_order(make_order('ORD-2'), CENTRAL) is not None
+    assert events == []
+
+
+def test_orders_over_one_drone_payload_are_rejected(client, app_state):
+    response = client.post('/api/place-order', json=order_payload(quantity=shop.DRONE_PAYLOAD_ITEMS + 1))
+    assert response.status_code == 400
+    assert response.get_json()['details'][0]['field'] == 'items'
+    assert len(app_state.orders) == 0
+    assert client.post('/api/place-order', json=order_payload(quantity=shop.DRONE_PAYLOAD_ITEMS)).status_code == 200
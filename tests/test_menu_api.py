@@ -0,0 +1,72 @@
+import copy
+import json
+
+import all_in_one_app as shop
+
+
+def menu_with_price(item_id, price):
+    menu = copy.deepcopy(shop.load_menu_data())
+    for category in menu['categories']:
+        for item in category['items']:
+            if item['id'] == item_id:
+                item['price'] = price
+    return menu
+
+
+def body(variants):
+    return json.loads(variants['identity'][0])
+
+
+def test_menu_revalidates_with_304(client):
+    first = client.get('/api/menu')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'no-cache'
+    assert first.get_json()['version'] == shop.menu_catalog.version
+    again = client.get('/api/menu', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_republishing_an_unchanged_menu_keeps_the_version():
+    catalog = shop.MenuCatalog()
+    version = catalog.publish(shop.load_menu_data())
+    etag = catalog.etag
+    assert catalog.publish(copy.deepcopy(shop.load_menu_data())) == version
+    assert catalog.etag == etag
+
+
+def test_delta_holds_only_what_changed_since_a_version():
+    catalog = shop.MenuCatalog()
+    first = catalog.publish(shop.load_menu_data())
+    second = catalog.publish(menu_with_price('s1', 1))
+    delta = body(catalog.delta(first))
+    assert (delta['since'], delta['version']) == (first, second)
+    assert [item['id'] for item in delta['items']] == ['s1']
+    assert delta['items'][0]['price'] == 1
+    assert body(catalog.delta(second))['items'] == []
+    # Deltas are built once per version
+    assert catalog.delta(first) is catalog.delta(first)
+
+    menu = menu_with_price('s1', 1)
+    menu['categories'][0]['items'] = [item for item in menu['categories'][0]['items'] if item['id'] != 's2']
+    catalog.publish(menu)
+    assert body(catalog.delta(second))['removed'] == ['s2']
+
+
+def test_delta_is_none_past_the_retained_history():
+    catalog = shop.MenuCatalog()
+    first = catalog.publish(shop.load_menu_data())
+    for price in range(shop.MENU_HISTORY_LIMIT + 1):
+        catalog.publish(menu_with_price('s1', price))
+    assert catalog.delta(first) is None
+
+
+def test_menu_api_serves_deltas(client, monkeypatch):
+    catalog = shop.MenuCatalog()
+    first = catalog.publish(shop.load_menu_data())
+    catalog.publish(menu_with_price('s1', 1))
+    monkeypatch.setattr(shop, 'menu_catalog', catalog)
+    delta = client.get(f'/api/menu?since={first}').get_json()
+    assert [item['id'] for item in delta['items']] == ['s1']
+    # Too far behind for a delta: the full menu
+    assert 'since' not in client.get('/api/menu?since=-1000').get_json()
+    assert client.get('/api/menu?since=latest').status_code == 400
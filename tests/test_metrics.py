@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+import all_in_one_app as shop
+from conftest import order_payload
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = shop.MetricsRegistry()
+    registry.describe('http_requests_total', 'counter', "Requests handled, by status")
+    monkeypatch.setattr(shop, 'metrics', registry)
+    monkeypatch.setattr(shop, 'METRICS_ENABLED', True)
+    return registry
+
+
+def scrape(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    return response.get_data(as_text=True).splitlines()
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    for seconds in (0.0001, 0.003, 0.003, 20):
+        registry.observe('latency', (('route', '/'),), seconds)
+    lines = registry.render().splitlines()
+    assert 'latency_bucket{route="/",le="0.0005"} 1' in lines
+    assert 'latency_bucket{route="/",le="0.005"} 3' in lines
+    assert 'latency_bucket{route="/",le="10.0"} 3' in lines
+    assert 'latency_bucket{route="/",le="+Inf"} 4' in lines
+    assert 'latency_count{route="/"} 4' in lines
+
+
+def test_requests_are_timed_per_route_and_counted_per_status(client, registry):
+    client.get('/api/menu/item/s1')
+    client.get('/api/menu/item/nope')
+    client.get('/no/such/page')
+    lines = scrape(client)
+    assert '# TYPE http_requests_total counter' in lines
+    assert 'http_requests_total{route="/api/menu/item/<item_id>",method="GET",status="200"} 1' in lines
+    assert 'http_requests_total{route="/api/menu/item/<item_id>",method="GET",status="404"} 1' in lines
+    # Unknown URLs share one label
+    assert 'http_requests_total{route="<unmatched>",method="GET",status="404"} 1' in lines
+    assert any(line.startswith('http_request_duration_seconds_count{route="/api/menu/item/<item_id>"')
+               for line in lines)
+
+
+def test_place_order_phases_and_gauges(client, registry):
+    client.post('/api/place-order', json=order_payload())
+    lines = scrape(client)
+    for name in ('parse_json', 'build_order', 'save_order'):
+        assert f'app_phase_duration_seconds_count{{phase="{name}"}} 1' in lines
+    assert 'app_orders 1' in lines
+    assert 'app_order_event_subscribers 0' in lines
+
+
+def test_slow_requests_are_written_as_folded_stacks(tmp_path):
+    output = tmp_path / 'slow.folded'
+    profiler = shop.SlowRequestProfiler(0.01, 0.001, str(output))
+    profiler.begin()
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        pass
+    profiler.end('GET /slow', 0.1)
+    # A fast request leaves nothing behind
+    profiler.begin()
+    profiler.end('GET /fast', 0.001)
+    lines = output.read_text().splitlines()
+    assert lines and all(line.startswith('GET /slow;') for line in lines)
+    assert 'test_slow_requests_are_written_as_folded_stacks' in lines[0]
+    assert int(lines[0].rsplit(' ', 1)[1]) >= 1
@@ -0,0 +1,91 @@
+import json
+import os
+from datetime import datetime
+
+import all_in_one_app as shop
+from test_order_store import make_order
+
+
+def new_events(buffer_size=8, history_size=16, max_subscribers=4):
+    return shop.OrderEvents(buffer_size, history_size, max_subscribers)
+
+
+def parse(message):
+    fields = dict(line.split(': ', 1) for line in message.decode().strip().split('\n'))
+    return fields['id'], json.loads(fields['data'])
+
+
+def test_each_event_is_serialized_once_and_fanned_out():
+    events = new_events()
+    first, second = events.subscribe(), events.subscribe()
+    events.publish('ORD-1', 'placed', total=249)
+    [a], [b] = first.drain(), second.drain()
+    assert a is b
+    event_id, data = parse(a)
+    assert event_id == f'{os.getpid()}-1'
+    assert (data['order_id'], data['status'], data['total']) == ('ORD-1', 'placed', 249)
+
+
+def test_a_subscriber_that_falls_behind_is_told_to_resync():
+    events = new_events(buffer_size=2)
+    subscriber = events.subscribe()
+    for i in range(3):
+        events.publish(f'ORD-{i}', 'placed')
+    assert subscriber.overflowed and subscriber.drain() == []
+    stream = shop.stream_order_events(subscriber)
+    assert next(stream).startswith(b'retry:')
+    assert next(stream).startswith(b'event: resync')
+    # A stream that ends gives its slot back
+    assert len(events) == 1
+    stream.close()
+
+
+def test_reconnecting_client_resumes_from_last_event_id():
+    events = new_events(history_size=3)
+    for i in range(4):
+        events.publish(f'ORD-{i}', 'placed')
+    resumed = events.subscribe(f'{os.getpid()}-2')
+    assert [parse(message)[1]['order_id'] for message in resumed.drain()] == ['ORD-2', 'ORD-3']
+    # Too far behind for the history, or numbered by another worker
+    assert events.subscribe(f'{os.getpid()}-0').overflowed
+    assert events.subscribe(f'{os.getpid() + 1}-3').overflowed
+    assert events.subscribe('garbage').overflowed
+
+
+def test_subscriber_limit_is_a_503(client, app_state):
+    app_state.order_events.max_subscribers = 0
+    response = client.get('/api/orders/events')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+
+def test_placing_and_deleting_publish_events(client, app_state):
+    subscriber = app_state.order_events.subscribe()
+    order_id = client.post('/api/place-order', json={
+        'items': [{'id': 's1', 'quantity': 1}],
+        'customerInfo': {'name': 'Test', 'phone': '9876543210', 'address': '12 Main Street',
+                         'pincode': shop.VALID_PINCODES[0]}}).get_json()['order_id']
+    client.delete(f'/api/delete-order/{order_id}')
+    assert [parse(message)[1]['status'] for message in subscriber.drain()] == ['placed', 'deleted']
+
+
+def test_other_workers_orders_are_announced_from_the_feed(tmp_path, monkeypatch):
+    events = new_events()
+    monkeypatch.setattr(shop, 'order_events', events)
+    subscriber = events.subscribe()
+    path = str(tmp_path / 'orders.db')
+    ours, theirs = shop.SQLiteOrderStore(path), shop.SQLiteOrderStore(path)
+    feed = shop.OrderFeed(ours, interval=3600)
+    feed.subscribe(shop._announce_added, shop._announce_deleted)
+
+    placed = make_order(shop.generate_order_id())
+    imported = make_order(shop.order_id_bound(datetime(2020, 1, 1)))
+    theirs.add_many([placed, imported])
+    # Ours were announced when they were made
+    feed.note_local(added=['ORD-LOCAL'])
+    ours.add(make_order('ORD-LOCAL'))
+    feed.poll()
+    theirs.delete(placed['id'])
+    feed.poll()
+    assert [(data['order_id'], data['status']) for _, data in map(parse, subscriber.drain())] == [
+        (placed['id'], 'placed'), (placed['id'], 'deleted')]
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+import all_in_one_app as shop
+from conftest import order_payload
+
+
+def import_lines(client, lines):
+    body = '\n'.join(json.dumps(line) for line in lines)
+    return client.post('/api/orders/import', data=body, content_type='application/x-ndjson').get_json()
+
+
+@pytest.mark.parametrize('query', ['since=1960-01-01', 'until=1960-01-01', 'since=9999-12-31'])
+def test_export_accepts_any_date(client, query):
+    client.post('/api/place-order', json=order_payload())
+    response = client.get(f"/api/orders/export?{query}")
+    assert response.status_code == 200
+    assert response.data.count(b'\n') == (1 if query == 'since=1960-01-01' else 0)
+
+
+def test_reimporting_an_export_is_idempotent(client, app_state):
+    for quantity in (1, 2):
+        client.post('/api/place-order', json=order_payload(quantity=quantity))
+    exported = [json.loads(line) for line in client.get('/api/orders/export').data.splitlines()]
+    assert import_lines(client, exported)['skipped'] == 2
+
+    app_state.orders.clear()
+    result = import_lines(client, exported)
+    assert (result['imported'], result['failed']) == (2, 0)
+    assert [order['id'] for order in app_state.orders] == [order['id'] for order in exported]
+
+
+@pytest.mark.parametrize('order_id', [
+    'XYZ-06GKK0QHU43IL000',  # right length and alphabet, wrong prefix
+    'ORD-06GKK0QHU43IL00',
+    'ORD-202401011200-abcdef12',
+    42,
+])
+def test_import_rejects_ids_that_are_not_order_ids(client, app_state, order_id):
+    line = dict(order_payload(), id=order_id)
+    result = import_lines(client, [line])
+    assert (result['imported'], result['failed']) == (0, 1)
+    assert result['errors'][0]['details'][0]['field'] == 'id'
+    assert len(app_state.orders) == 0
+
+
+def test_order_id_time_needs_the_prefix():
+    order_id = shop.generate_order_id()
+    assert shop.order_id_time(order_id) is not None
+    assert shop.order_id_time('XYZ-' + order_id[len(shop.ORDER_ID_PREFIX):]) is None
+    assert shop.order_id_time(None) is None
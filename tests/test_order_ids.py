@@ -0,0 +1,79 @@
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+import all_in_one_app as shop
+
+
+def generate(count):
+    return [shop.generate_order_id() for _ in range(count)]
+
+
+def test_ids_are_unique_and_monotonic_across_threads():
+    with ThreadPoolExecutor(4) as pool:
+        batches = list(pool.map(generate, [20000] * 4))
+    ids = [order_id for batch in batches for order_id in batch]
+    assert len(set(ids)) == len(ids)
+    assert all(batch == sorted(batch) for batch in batches)
+
+
+def generate_as_worker(args):
+    # What a production worker does: a worker ID of its own, and several
+    # request threads sharing the process's generator
+    worker_id, count = args
+    shop.generate_order_id.set_worker(worker_id)
+    with ThreadPoolExecutor(4) as pool:
+        return list(pool.map(generate, [count // 4] * 4))
+
+
+def test_millions_of_ids_are_unique_across_workers_and_threads():
+    workers, per_worker = 4, 500000
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        results = pool.map(generate_as_worker, [(1000 + i, per_worker) for i in range(workers)])
+    batches = [batch for result in results for batch in result]
+    assert all(batch == sorted(batch) for batch in batches)
+    seen = set()
+    for batch in batches:
+        seen.update(batch)
+    assert len(seen) == workers * per_worker
+
+
+def test_ids_are_unique_across_forked_workers_without_assigned_ids():
+    # Each forked process draws its own worker ID
+    with multiprocessing.get_context('fork').Pool(3) as pool:
+        batches = pool.map(generate, [20000] * 3)
+    batches.append(generate(20000))
+    ids = [order_id for batch in batches for order_id in batch]
+    assert len(set(ids)) == len(ids)
+    assert all(batch == sorted(batch) for batch in batches)
+
+
+def test_many_matches_single_ids():
+    generator = shop.OrderIdGenerator(5)
+    ids = [generator()] + generator.many(5000) + [generator()]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    assert len({len(order_id) for order_id in ids}) == 1
+
+
+def test_id_encodes_its_creation_time():
+    before = datetime.now().replace(microsecond=0)
+    created = shop.order_id_time(shop.generate_order_id())
+    assert before <= created <= datetime.now()
+    assert shop.order_id_time('ORD-202401011200-abcdef12') is None
+
+
+def test_time_bounds_bracket_ids():
+    now = datetime.now()
+    order_id = shop.generate_order_id()
+    assert shop.order_id_bound(now - timedelta(seconds=1)) <= order_id
+    assert order_id < shop.order_id_bound(now + timedelta(seconds=1))
+
+
+@pytest.mark.parametrize('moment', [datetime(1960, 1, 1), datetime(9999, 12, 31)])
+def test_time_bounds_clamp_outside_the_id_range(moment):
+    bound = shop.order_id_bound(moment)
+    assert len(bound) == len(shop.generate_order_id())
+
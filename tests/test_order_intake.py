@@ -0,0 +1,61 @@
+import threading
+
+import all_in_one_app as shop
+from conftest import order_payload
+
+
+def use_intake(monkeypatch, save, queue_size=10, workers=2):
+    intake = shop.OrderIntake(save, queue_size, workers)
+    monkeypatch.setattr(shop, 'order_intake', intake)
+    return intake
+
+
+def test_async_order_is_accepted_then_confirmed(client, app_state, monkeypatch):
+    intake = use_intake(monkeypatch, shop.save_order)
+    response = client.post('/api/place-order-async', json=order_payload())
+    assert response.status_code == 202
+    order_id = response.get_json()['order_id']
+    assert response.get_json()['status'] == 'queued'
+    intake.join()
+    assert order_id in app_state.orders
+    assert client.get(f'/api/order-status/{order_id}').get_json()['status'] == 'confirmed'
+    assert client.get('/api/order-status/ORD-UNKNOWN').status_code == 404
+
+
+def test_full_queue_is_a_429(client, app_state, monkeypatch):
+    release = threading.Event()
+    def blocked_save(order):
+        release.wait()
+        shop.save_order(order)
+    intake = use_intake(monkeypatch, blocked_save, queue_size=1, workers=1)
+    statuses = [client.post('/api/place-order-async', json=order_payload()).status_code for _ in range(4)]
+    # One order held by the worker, one in the queue, the rest turned away
+    assert statuses.count(202) in (1, 2)
+    assert statuses[-1] == 429
+    response = client.post('/api/place-order-async', json=order_payload())
+    assert response.headers['Retry-After'] == '1'
+    release.set()
+    intake.join()
+    assert len(app_state.orders) == statuses.count(202)
+
+
+def test_failed_save_is_reported(client, app_state, monkeypatch):
+    def failing_save(order):
+        raise shop.OrderLogError("disk full")
+    intake = use_intake(monkeypatch, failing_save)
+    order_id = client.post('/api/place-order-async', json=order_payload()).get_json()['order_id']
+    intake.join()
+    assert client.get(f'/api/order-status/{order_id}').get_json()['status'] == 'failed'
+
+
+def test_drain_saves_queued_orders_before_exit(client, app_state, monkeypatch):
+    release = threading.Event()
+    def slow_save(order):
+        release.wait(0.05)
+        shop.save_order(order)
+    intake = use_intake(monkeypatch, slow_save, workers=1)
+    for _ in range(5):
+        assert client.post('/api/place-order-async', json=order_payload()).status_code == 202
+    assert intake.drain(timeout=0.01) is False
+    assert intake.drain(timeout=5) is True
+    assert len(app_state.orders) == 5
@@ -0,0 +1,128 @@
+import json
+import os
+
+import pytest
+
+import all_in_one_app as shop
+from conftest import order_payload
+from test_order_store import make_order
+
+
+def open_log(directory, **options):
+    store = shop.OrderStore()
+    log = shop.OrderLog(str(directory), store, flush_interval=0.001, **options)
+    return store, log
+
+
+def recover(directory):
+    store, log = open_log(directory)
+    counts = log.replay()
+    return store, counts
+
+
+def test_replay_applies_puts_and_deletes_in_order(tmp_path):
+    _, log = open_log(tmp_path)
+    log.start()
+    log.append_put(make_order('ORD-A'))
+    log.append_puts([make_order('ORD-B'), make_order('ORD-C')])
+    log.append_delete('ORD-B')
+    log.append_put(make_order('ORD-A', quantity=4))
+    log.close()
+
+    store, (loaded, replayed) = recover(tmp_path)
+    assert (loaded, replayed) == (0, 5)
+    assert [order['id'] for order in store] == ['ORD-C', 'ORD-A']
+    assert store.get('ORD-A')['items'][0]['quantity'] == 4
+
+
+def test_compaction_moves_the_log_into_a_snapshot(tmp_path):
+    store, log = open_log(tmp_path)
+    log.start()
+    for i in range(10):
+        order = make_order(f"ORD-{i}")
+        store.add(order)
+        log.append_put(order)
+    log.compact()
+    store.delete('ORD-3')
+    log.append_delete('ORD-3')
+    log.close()
+
+    recovered, (loaded, replayed) = recover(tmp_path)
+    assert (loaded, replayed) == (10, 1)
+    assert len(recovered) == 9
+    assert 'ORD-3' not in recovered
+
+
+def test_torn_final_record_is_ignored(tmp_path):
+    _, log = open_log(tmp_path)
+    log.start()
+    log.append_put(make_order('ORD-A'))
+    log.append_put(make_order('ORD-B'))
+    log.close()
+    with open(log.log_path, 'a', encoding='utf-8') as f:
+        f.write('{"op":"put","order":{"id":"ORD-C"')
+
+    store, (_, replayed) = recover(tmp_path)
+    assert replayed == 2
+    assert [order['id'] for order in store] == ['ORD-A', 'ORD-B']
+
+
+def test_failed_sync_raises_and_the_batch_is_dropped(tmp_path, monkeypatch):
+    _, log = open_log(tmp_path, retry_interval=0.01)
+    log.start()
+    log.append_put(make_order('ORD-A'))
+
+    fsync = os.fsync
+    def failing_fsync(fd):
+        raise OSError(28, 'No space left on device')
+    monkeypatch.setattr(shop.os, 'fsync', failing_fsync)
+    with pytest.raises(shop.OrderLogError):
+        log.append_put(make_order('ORD-B'))
+
+    # The caller was told ORD-B failed, so once the disk recovers it is not
+    # written behind the caller's back, and no torn bytes are left
+    monkeypatch.setattr(shop.os, 'fsync', fsync)
+    log.append_put(make_order('ORD-C'))
+    log.close()
+    with open(log.log_path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [record['order']['id'] for record in records] == ['ORD-A', 'ORD-C']
+
+
+def test_failed_sync_is_a_500_for_the_request(client, app_state, monkeypatch, tmp_path):
+    log = shop.OrderLog(str(tmp_path), app_state.orders, flush_interval=0.001, retry_interval=0.01)
+    log.start()
+    monkeypatch.setattr(shop, 'order_log', log)
+    fsync = os.fsync
+    def failing_fsync(fd):
+        raise OSError(5, 'Input/output error')
+    monkeypatch.setattr(shop.os, 'fsync', failing_fsync)
+    response = client.post('/api/place-order', json=order_payload())
+    monkeypatch.setattr(shop.os, 'fsync', fsync)
+    assert response.status_code == 500
+    assert 'durably' in response.get_json()['error']
+
+    # Nothing to list now, and nothing comes back after a restart either
+    assert client.get('/api/orders').get_json()['orders'] == []
+    assert client.post('/api/place-order', json=order_payload()).status_code == 200
+    log.close()
+    recovered, _ = recover(tmp_path)
+    assert [order['id'] for order in recovered] == [order['id'] for order in app_state.orders]
+    assert len(recovered) == 1
+
+
+def test_failed_delete_keeps_the_order(client, app_state, monkeypatch, tmp_path):
+    log = shop.OrderLog(str(tmp_path), app_state.orders, flush_interval=0.001, retry_interval=0.01)
+    log.start()
+    monkeypatch.setattr(shop, 'order_log', log)
+    order_id = client.post('/api/place-order', json=order_payload()).get_json()['order_id']
+    fsync = os.fsync
+    def failing_fsync(fd):
+        raise OSError(5, 'Input/output error')
+    monkeypatch.setattr(shop.os, 'fsync', failing_fsync)
+    response = client.delete(f'/api/delete-order/{order_id}')
+    monkeypatch.setattr(shop.os, 'fsync', fsync)
+    log.close()
+    assert response.status_code == 500
+    assert order_id in app_state.orders
+    assert order_id in recover(tmp_path)[0]
@@ -0,0 +1,132 @@
+import pytest
+
+import all_in_one_app as shop
+
+
+def make_order(order_id, phone='100', pincode='590006', quantity=1):
+    return {
+        'id': order_id,
+        'timestamp': '2026-01-01 12:00:00',
+        'items': [{'id': 's1', 'name': 'Paneer Tikka', 'price': 249, 'quantity': quantity}],
+        'customer_info': {'name': 'Test', 'phone': phone, 'pincode': pincode},
+        'total': 249 * quantity,
+    }
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return shop.OrderStore()
+    return shop.SQLiteOrderStore(str(tmp_path / 'orders.db'))
+
+
+def test_add_get_delete(store):
+    store.add(make_order('ORD-A'))
+    assert store.get('ORD-A')['total'] == 249
+    assert 'ORD-A' in store
+    assert len(store) == 1
+    assert store.delete('ORD-A')['id'] == 'ORD-A'
+    assert store.delete('ORD-A') is None
+    assert store.get('ORD-A') is None
+    assert len(store) == 0
+
+
+def test_round_trips_extra_fields(store):
+    order = dict(make_order('ORD-A'), delivery={'zone': 'north', 'fee': 0})
+    store.add(order)
+    assert store.get('ORD-A') == order
+
+
+def test_readding_replaces_the_order(store):
+    store.add(make_order('ORD-A', quantity=1))
+    store.add(make_order('ORD-A', quantity=3))
+    assert len(store) == 1
+    assert store.get('ORD-A')['items'][0]['quantity'] == 3
+
+
+def test_pages_are_stable_across_deletes(store):
+    store.add_many(make_order(f"ORD-{i:03d}") for i in range(10))
+    first, cursor = store.page(limit=4)
+    assert [order['id'] for order in first] == ['ORD-000', 'ORD-001', 'ORD-002', 'ORD-003']
+    # Deleting an order already paged past doesn't shift the next page
+    store.delete('ORD-001')
+    store.delete('ORD-005')
+    second, cursor = store.page(cursor, limit=4)
+    assert [order['id'] for order in second] == ['ORD-004', 'ORD-006', 'ORD-007', 'ORD-008']
+    rest, cursor = store.page(cursor, limit=4)
+    assert [order['id'] for order in rest] == ['ORD-009']
+    assert cursor is None
+
+
+def test_iteration_walks_every_order_in_insertion_order(store):
+    ids = [f"ORD-{i:03d}" for i in range(250)]
+    store.add_many(make_order(order_id) for order_id in ids)
+    assert [order['id'] for order in store] == ids
+
+
+def test_range_by_id_is_sorted_after_out_of_order_inserts(store):
+    store.add_many(make_order(f"ORD-{i:03d}") for i in range(50, 100))
+    # Imports of older orders, one at a time and in a batch
+    store.add(make_order('ORD-010'))
+    store.add_many(make_order(f"ORD-{i:03d}") for i in range(40, 0, -3))
+    store.delete('ORD-060')
+    ids = [order['id'] for order in store.range_by_id()]
+    assert ids == sorted(ids)
+    assert 'ORD-060' not in ids
+    assert len(ids) == len(store)
+    window = [order['id'] for order in store.range_by_id('ORD-010', 'ORD-052')]
+    assert window == [order_id for order_id in ids if 'ORD-010' <= order_id < 'ORD-052']
+
+
+def test_range_by_id_after_many_deletes(store):
+    store.add_many(make_order(f"ORD-{i:05d}") for i in range(3000))
+    for i in range(0, 3000, 2):
+        store.delete(f"ORD-{i:05d}")
+    ids = [order['id'] for order in store.range_by_id('ORD-01000', 'ORD-01010')]
+    assert ids == ['ORD-01001', 'ORD-01003', 'ORD-01005', 'ORD-01007', 'ORD-01009']
+
+
+def test_secondary_indexes_follow_deletes(store):
+    store.add(make_order('ORD-A', phone='1', pincode='590006'))
+    store.add(make_order('ORD-B', phone='1', pincode='590008'))
+    store.add(make_order('ORD-C', phone='2', pincode='590006'))
+    assert sorted(order['id'] for order in store.by_phone('1')) == ['ORD-A', 'ORD-B']
+    assert sorted(order['id'] for order in store.by_pincode('590006')) == ['ORD-A', 'ORD-C']
+    store.delete('ORD-A')
+    assert [order['id'] for order in store.by_phone('1')] == ['ORD-B']
+    assert [order['id'] for order in store.by_pincode('590006')] == ['ORD-C']
+    assert store.by_phone('3') == []
+
+
+def test_clear(store):
+    store.add_many(make_order(f"ORD-{i}") for i in range(5))
+    store.clear()
+    assert len(store) == 0
+    assert list(store.range_by_id()) == []
+    store.add(make_order('ORD-9'))
+    assert [order['id'] for order in store] == ['ORD-9']
+
+
+def test_sqlite_tails_orders_from_other_connections(tmp_path):
+    path = str(tmp_path / 'orders.db')
+    reader, writer = shop.SQLiteOrderStore(path), shop.SQLiteOrderStore(path)
+    seq = reader.last_seq()
+    writer.add_many(make_order(f"ORD-{i}") for i in range(3))
+    added, seq = reader.added_after(seq)
+    assert [order['id'] for order in added] == ['ORD-0', 'ORD-1', 'ORD-2']
+    assert reader.added_after(seq) == ([], seq)
+    deleted_seq = reader.last_deleted_seq()
+    writer.delete('ORD-1')
+    writer.delete('ORD-7')
+    assert reader.existing_ids(['ORD-0', 'ORD-1', 'ORD-7']) == {'ORD-0'}
+    deleted, deleted_seq = reader.deleted_after(deleted_seq)
+    assert deleted == ['ORD-1']
+    assert reader.deleted_after(deleted_seq) == ([], deleted_seq)
+
+
+def test_sqlite_shared_state_versions(tmp_path):
+    store = shop.SQLiteOrderStore(str(tmp_path / 'orders.db'))
+    assert store.get_state('dispatch') == (0, None)
+    store.put_state('dispatch', '[]')
+    store.put_state('dispatch', '[1]')
+    assert store.get_state('dispatch') == (2, '[1]')
@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import order_payload
+
+
+def test_concurrent_place_delete_and_list_lose_nothing(app_state, client):
+    # Every acknowledged order must survive, and no deleted order may come
+    # back, while places, deletes and page reads race each other
+    shop = app_state
+    payload = order_payload()
+    placed = []
+    deleted = []
+
+    def place(_):
+        client = shop.app.test_client()
+        response = client.post('/api/place-order', json=payload)
+        assert response.status_code == 200
+        placed.append(response.get_json()['order_id'])
+        # Delete every other order straight away, racing with other inserts
+        if len(placed) % 2 == 0:
+            victim = placed[len(placed) // 2]
+            if client.delete(f"/api/delete-order/{victim}").status_code == 200:
+                deleted.append(victim)
+        assert client.get('/api/orders?limit=100').status_code == 200
+
+    with ThreadPoolExecutor(16) as pool:
+        list(pool.map(place, range(1000)))
+
+    remaining = {order['id'] for order in shop.orders}
+    assert len(set(placed)) == 1000
+    assert remaining == set(placed) - set(deleted)
+    assert len(shop.orders) == len(remaining)
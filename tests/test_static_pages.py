@@ -0,0 +1,40 @@
+import gzip
+
+import pytest
+
+import all_in_one_app as shop
+
+
+@pytest.mark.parametrize('path', ['/', '/checkout', '/confirmation'])
+def test_static_pages_revalidate_with_304(client, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == shop.STATIC_PAGE_CACHE_CONTROL
+    assert first.headers['Vary'] == 'Accept-Encoding'
+
+    again = client.get(path, headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+    # A stale tag gets the page
+    assert client.get(path, headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_each_encoding_has_its_own_etag(client):
+    plain = client.get('/', headers={'Accept-Encoding': 'identity'})
+    zipped = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.data) == plain.data
+    assert zipped.headers['ETag'] != plain.headers['ETag']
+    # A gzip tag doesn't validate the identity body
+    response = client.get('/', headers={'Accept-Encoding': 'identity', 'If-None-Match': zipped.headers['ETag']})
+    assert response.status_code == 200
+
+
+def test_pages_are_rendered_once(client, monkeypatch):
+    client.get('/checkout')
+    def fail(*args, **kwargs):
+        raise AssertionError("page rendered per request")
+    monkeypatch.setattr(shop, 'render_template', fail)
+    assert client.get('/checkout').status_code == 200
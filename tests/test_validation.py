@@ -0,0 +1,102 @@
+import pytest
+
+import all_in_one_app as shop
+from conftest import order_payload
+
+
+def errors_for(payload):
+    with pytest.raises(shop.OrderValidationError) as caught:
+        shop.validate_order_payload(payload)
+    return {error['field']: error['message'] for error in caught.value.details}
+
+
+def test_valid_payload_is_cleaned_of_unknown_fields():
+    payload = order_payload()
+    payload['customerInfo']['isAdmin'] = True
+    payload['coupon'] = 'FREE'
+    cleaned = shop.validate_order_payload(payload)
+    assert 'coupon' not in cleaned
+    assert 'isAdmin' not in cleaned['customerInfo']
+    assert cleaned['items'] == [{'id': 's1', 'quantity': 1}]
+
+
+def test_missing_fields_are_reported_by_path():
+    payload = order_payload()
+    del payload['customerInfo']['name']
+    del payload['items'][0]['quantity']
+    errors = errors_for(payload)
+    assert set(errors) == {'customerInfo.name', 'items[0].quantity'}
+
+
+@pytest.mark.parametrize('field, value', [
+    ('quantity', 0),
+    ('quantity', shop.MAX_ITEM_QUANTITY + 1),
+    ('quantity', 1.5),
+    ('quantity', True),
+    ('quantity', '2'),
+    ('id', ''),
+])
+def test_bad_line_values(field, value):
+    payload = order_payload()
+    payload['items'][0][field] = value
+    assert f"items[0].{field}" in errors_for(payload)
+
+
+def test_limits_on_lines_and_lengths():
+    payload = order_payload()
+    payload['items'] = payload['items'] * (shop.MAX_CART_LINES + 1)
+    payload['customerInfo']['address'] = 'x' * 501
+    errors = errors_for(payload)
+    assert 'items' in errors
+    assert 'customerInfo.address' in errors
+
+
+def test_error_list_is_capped():
+    payload = order_payload()
+    payload['items'] = [{'id': 7, 'quantity': -1}] * shop.MAX_CART_LINES
+    with pytest.raises(shop.OrderValidationError) as caught:
+        shop.validate_order_payload(payload)
+    assert len(caught.value.details) == shop.MAX_VALIDATION_ERRORS
+
+
+@pytest.mark.parametrize('body', ['[1, 2]', '"order"', '42', 'true'])
+def test_place_order_rejects_non_object_bodies(client, body):
+    response = client.post('/api/place-order', data=body, content_type='application/json')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_place_order_reports_validation_details(client):
+    payload = order_payload()
+    payload['items'][0]['quantity'] = 0
+    response = client.post('/api/place-order', json=payload)
+    assert response.status_code == 400
+    assert response.get_json()['details'][0]['field'] == 'items[0].quantity'
+
+
+def test_place_order_rejects_unknown_items_and_pincodes(client):
+    payload = order_payload()
+    payload['items'][0]['id'] = 'no-such-dish'
+    assert client.post('/api/place-order', json=payload).status_code == 400
+    assert client.post('/api/place-order', json=order_payload(pincode='000000')).status_code == 400
+
+
+def test_oversized_body_reports_the_limit_that_applied(client):
+    body = b'{"pad": "' + b'x' * shop.MAX_ORDER_BYTES + b'"}'
+    response = client.post('/api/place-order', data=body, content_type='application/json')
+    assert response.status_code == 413
+    assert str(shop.MAX_ORDER_BYTES) in response.get_json()['error']
+    # The batch endpoint raises the limit for its own requests
+    response = client.post('/api/place-orders', data=b'[' + b' ' * shop.MAX_BATCH_BYTES + b']',
+                           content_type='application/json')
+    assert response.status_code == 413
+    assert str(shop.MAX_BATCH_BYTES) in response.get_json()['error']
+
+
+def test_valid_order_is_placed_and_priced_from_the_menu(client, app_state):
+    payload = order_payload(quantity=2)
+    payload['items'][0]['price'] = 1
+    response = client.post('/api/place-order', json=payload)
+    assert response.status_code == 200
+    order = app_state.orders.get(response.get_json()['order_id'])
+    assert order['total'] == 2 * shop.MENU_PRICES['s1'] + order.get('delivery', {}).get('fee', 0)